@@ -0,0 +1,174 @@
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire `ttl` seconds after they
+    were last written. `ttl=None` disables expiry. Both limits bound memory:
+    the least recently used entry is evicted once `max_size` is reached.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, max_size: int = 1024, ttl: float = None):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, self._MISSING)
+            if entry is self._MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, self._MISSING)
+        return default if entry is self._MISSING else entry[1]
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, self._MISSING) is not self._MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def purge_expired(self) -> int:
+        """Drop every expired entry; returns how many were removed."""
+        if self.ttl is None:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, (expires_at, _) in self._data.items() if expires_at <= now]
+            for key in expired:
+                del self._data[key]
+        return len(expired)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+class DiskLRUCache:
+    """
+    Files in `directory`, named `<key><suffix>`, evicted least recently used
+    first once their total size passes `max_bytes`. The index lives in
+    memory and is rebuilt from the directory (oldest access first) on
+    start-up, so cached files survive restarts. Entries are written to a
+    temp file and renamed into place, so readers never see partial files.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024, suffix: str = ""):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.total_bytes = 0
+        self._index = OrderedDict()  # key -> size
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(directory):
+            if entry.is_file() and entry.name.endswith(suffix) and not entry.name.startswith("."):
+                stat = entry.stat()
+                entries.append((stat.st_atime, entry.name[:len(entry.name) - len(suffix)], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self.total_bytes += size
+        self._evict()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, key: str) -> Optional[str]:
+        """Path of the cached file, or None (also when it was deleted behind our back)."""
+        path = self.path(key)
+        with self._lock:
+            if key in self._index and not os.path.exists(path):
+                self.total_bytes -= self._index.pop(key)
+            if key not in self._index:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self.hits += 1
+        return path
+
+    def put(self, key: str, write: Callable[[str], None]) -> str:
+        """Create the entry by calling `write(tmp_path)`; returns its final path."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-", suffix=self.suffix)
+        os.close(fd)
+        try:
+            write(tmp_path)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            self.total_bytes += size - self._index.pop(key, 0)
+            self._index[key] = size
+            self._evict(keep=key)
+        return self.path(key)
+
+    def _evict(self, keep: Optional[str] = None):
+        while self.total_bytes > self.max_bytes and self._index:
+            key = next(iter(self._index))
+            if key == keep:
+                break
+            self.total_bytes -= self._index.pop(key)
+            self.evictions += 1
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._index),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
@@ -1,17 +1,105 @@
 import os
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "Med Companion"
     VERSION: str = "0.1.0"
     API_V1_STR: str = "/api/v1"
     
-    # Database
-    DATABASE_URL: str = "sqlite:///./medcompanion.db"
+    # Database (async driver URL)
+    DATABASE_URL: str = "sqlite+aiosqlite:///./medsy.db"
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_BUSY_TIMEOUT_MS: int = 5000
+    DB_ECHO: bool = False
+
+    # Chat history write-behind buffer
+    CHAT_HISTORY_BATCH_SIZE: int = 500
+    CHAT_HISTORY_FLUSH_SECONDS: float = 1.0
+    CHAT_HISTORY_MAX_QUEUE: int = 10000
+    # Rows of recent history kept in memory per active user (generator context)
+    CHAT_CONTEXT_TURNS: int = 10
+    CHAT_RECENT_CACHE_USERS: int = 10000
+    CHAT_HISTORY_PAGE_MAX: int = 100
+
+    # Generator context: approximate token budget and profile cache lifetime
+    CONTEXT_MAX_TOKENS: int = 512
+    CONTEXT_PROFILE_TTL_SECONDS: float = 300
+
+    # Generator response cache (0 entries disables it)
+    RESPONSE_CACHE_SIZE: int = 2048
+    RESPONSE_CACHE_TTL_SECONDS: float = 3600
+
+    # Canned fallback replies (JSON/YAML rule table; built-in rules when unset)
+    RESPONSE_RULES_PATH: Optional[str] = None
+
+    # Reply generation: "mock" (keyword replies) or "openai" (any compatible /v1/chat/completions)
+    LLM_BACKEND: str = "mock"
+    LLM_BASE_URL: str = "https://api.openai.com"
+    LLM_API_KEY: Optional[str] = None
+    LLM_MODEL: str = "gpt-4o"
+    LLM_TIMEOUT_SECONDS: float = 10.0
+    LLM_CONNECT_TIMEOUT_SECONDS: float = 2.0
+    LLM_MAX_RETRIES: int = 2
+    LLM_MAX_CONCURRENCY: int = 32
+    LLM_MAX_CONNECTIONS: int = 64
+    LLM_BREAKER_THRESHOLD: int = 5
+    LLM_BREAKER_RESET_SECONDS: float = 30.0
     
     # Logging
     LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # "json" or "text"
+    LOG_FILE: str = "app.log"
+    LOG_ROTATION: str = "size"  # "size" or "time"
+    LOG_MAX_BYTES: int = 10 * 1024 * 1024
+    LOG_ROTATE_WHEN: str = "midnight"
+    LOG_BACKUP_COUNT: int = 5
+    # Fraction of sub-WARNING records kept per logger, e.g. {"httpx": 0.1}
+    LOG_SAMPLE_RATES: Dict[str, float] = {}
+
+    # Metrics (/metrics in Prometheus text format)
+    METRICS_ENABLED: bool = True
+
+    # Startup
+    WARMUP_ON_STARTUP: bool = True
+
+    # Executors for CPU-bound request work (0 processes = thread pool only)
+    CPU_THREAD_POOL_SIZE: int = os.cpu_count() or 4
+    CPU_PROCESS_POOL_SIZE: int = 0
+
+    # Booking sessions ("memory" per worker, or "sqlite" shared across workers)
+    SESSION_BACKEND: str = "memory"
+    SESSION_MAX_ENTRIES: int = 10000
+    SESSION_TTL_SECONDS: int = 3600
+    SESSION_DB_PATH: str = "./sessions.db"
+
+    # Intent classification
+    INTENT_BACKEND: str = "forest"  # "forest" or "linear"
+    INTENT_BATCH_MAX_SIZE: int = 32
+    INTENT_BATCH_WAIT_MS: float = 2.0
+
+    # Server-side speech-to-text ("stub", or a SpeechRecognition recognizer such as "sphinx")
+    VOICE_STT_ENGINE: str = "stub"
+    VOICE_WORKERS: int = 2
+    VOICE_MAX_QUEUE: int = 8
+    VOICE_MAX_UPLOAD_BYTES: int = 10 * 1024 * 1024
+    VOICE_SPOOL_MAX_BYTES: int = 1024 * 1024
+    # Streaming STT (/voice/stream): RMS energy that counts as speech, the
+    # pause that ends an utterance, and how often partials are produced
+    VOICE_VAD_THRESHOLD: float = 500.0
+    VOICE_VAD_HANGOVER_MS: int = 600
+    VOICE_PARTIAL_INTERVAL_MS: int = 1000
+    VOICE_MAX_UTTERANCE_MS: int = 15000
+    # Server-side text-to-speech ("stub" or "pyttsx3"), cached on disk
+    TTS_ENGINE: str = "stub"
+    TTS_CACHE_DIR: str = "./tts_cache"
+    TTS_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    TTS_DEFAULT_VOICE: str = "default"
+    TTS_DEFAULT_RATE: int = 150
+    TTS_MAX_CHARS: int = 1000
     
     class Config:
         env_file = ".env"
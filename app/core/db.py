@@ -0,0 +1,75 @@
+from contextlib import asynccontextmanager
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app.core.config import settings
+from app.models.migrations import migrate
+
+# Async engine and per-request sessions. Locally this is SQLite through
+# aiosqlite; any async driver URL (e.g. postgresql+asyncpg://...) works in
+# production via DATABASE_URL.
+
+def _sqlite_pragmas(dbapi_conn, _record):
+    # WAL lets readers proceed while a write is in flight; NORMAL sync is
+    # durable across application crashes and much cheaper than FULL.
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.DB_BUSY_TIMEOUT_MS)}")
+    # Enforce users.user_id references like other backends do
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+def create_db_engine(url: str = None) -> AsyncEngine:
+    url = make_url(url or settings.DATABASE_URL)
+    kwargs = {"echo": settings.DB_ECHO}
+    is_sqlite = url.get_backend_name() == "sqlite"
+    if is_sqlite and url.database in (None, "", ":memory:"):
+        # One shared connection, otherwise every checkout sees an empty database
+        kwargs["poolclass"] = StaticPool
+    else:
+        kwargs.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=not is_sqlite,
+        )
+    engine = create_async_engine(url, **kwargs)
+    if is_sqlite:
+        event.listen(engine.sync_engine, "connect", _sqlite_pragmas)
+    return engine
+
+engine = create_db_engine()
+AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+
+_schema_ready = False
+
+async def init_db(db_engine: AsyncEngine = None):
+    """Create missing tables and apply pending migrations. Idempotent."""
+    global _schema_ready
+    async with (db_engine or engine).connect() as conn:
+        await conn.run_sync(migrate)
+    if db_engine is None or db_engine is engine:
+        _schema_ready = True
+
+async def dispose_engine():
+    global _schema_ready
+    await engine.dispose()
+    _schema_ready = False
+
+@asynccontextmanager
+async def db_session():
+    if not _schema_ready:
+        # Covers callers that skip the lifespan (e.g. TestClient without `with`)
+        await init_db()
+    async with AsyncSessionLocal() as session:
+        yield session
+
+async def get_db():
+    """FastAPI dependency: one session per request, closed afterwards."""
+    async with db_session() as session:
+        yield session
@@ -0,0 +1,85 @@
+import asyncio
+import importlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Optional
+
+from app.core.config import settings
+
+# Shared pools for CPU-bound request work, created lazily so importing this
+# module (e.g. in tests) never starts threads or processes.
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+# Modules imported once in each worker process so the first task does not
+# pay for constructing the service singletons it uses. Only the lightweight
+# stage module: importing the routers would build the session store, LLM
+# client and database engine in every worker.
+PROCESS_POOL_PRELOAD = ("app.services.cpu_stages",)
+
+def _preload_modules(modules):
+    for module in modules:
+        importlib.import_module(module)
+
+def _noop():
+    return None
+
+def get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(
+            max_workers=settings.CPU_THREAD_POOL_SIZE,
+            thread_name_prefix="medsy-cpu"
+        )
+    return _thread_pool
+
+def get_process_pool() -> Optional[ProcessPoolExecutor]:
+    """Return the process pool, or None when CPU_PROCESS_POOL_SIZE is 0."""
+    global _process_pool
+    if _process_pool is None and settings.CPU_PROCESS_POOL_SIZE > 0:
+        # "spawn" avoids forking a parent that already runs threads
+        _process_pool = ProcessPoolExecutor(
+            max_workers=settings.CPU_PROCESS_POOL_SIZE,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_preload_modules,
+            initargs=(PROCESS_POOL_PRELOAD,)
+        )
+    return _process_pool
+
+async def run_in_thread(func, *args, **kwargs):
+    """
+    Run a blocking call on the shared thread pool. Use this for sklearn/numpy
+    work, which releases the GIL for most of its runtime.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_thread_pool(), partial(func, *args, **kwargs))
+
+async def run_in_process(func, *args, **kwargs):
+    """
+    Run a pure-Python stage on the process pool so it does not contend for
+    the GIL. `func` must be a picklable module-level function. Falls back to
+    the thread pool when no process pool is configured.
+    """
+    pool = get_process_pool()
+    if pool is None:
+        return await run_in_thread(func, *args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, partial(func, *args, **kwargs))
+
+def start_executors():
+    """Create the pools up front and spawn every worker process before serving traffic."""
+    get_thread_pool()
+    pool = get_process_pool()
+    if pool is not None:
+        for future in [pool.submit(_noop) for _ in range(settings.CPU_PROCESS_POOL_SIZE)]:
+            future.result()
+
+def shutdown_executors():
+    global _thread_pool, _process_pool
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=True)
+        _thread_pool = None
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True)
+        _process_pool = None
@@ -1,46 +1,149 @@
+import atexit
+import json
 import logging
 import logging.config
+import logging.handlers
+import queue
 import sys
+import threading
+from datetime import datetime, timezone
 from app.core.config import settings
 
+# Root (and uvicorn.access) only enqueue records; a QueueListener thread does
+# the formatting and the console/file writes, so log calls never block the
+# event loop on I/O.
+_listener = None
+
+# LogRecord attributes that are not user-supplied `extra=` fields
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra=` fields are included as top-level keys."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps 1 in N records below WARNING for loggers listed in `rates`
+    (logger name prefix -> fraction to keep). Warnings and errors always pass.
+    """
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.every = {name: max(1, round(1 / rate)) if rate > 0 else 0 for name, rate in rates.items()}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def _every(self, name: str):
+        while name:
+            if name in self.every:
+                return name, self.every[name]
+            name = name.rpartition(".")[0]
+        return None, 1
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        prefix, every = self._every(record.name)
+        if every == 1:
+            return True
+        if every == 0:
+            return False
+        with self._lock:
+            count = self._counts.get(prefix, 0)
+            self._counts[prefix] = count + 1
+        return count % every == 0
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Only merge args and render the traceback; full formatting happens
+        # on the listener thread.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def _file_handler() -> logging.Handler:
+    if settings.LOG_ROTATION == "time":
+        return logging.handlers.TimedRotatingFileHandler(
+            settings.LOG_FILE, when=settings.LOG_ROTATE_WHEN,
+            backupCount=settings.LOG_BACKUP_COUNT, encoding="utf8")
+    return logging.handlers.RotatingFileHandler(
+        settings.LOG_FILE, maxBytes=settings.LOG_MAX_BYTES,
+        backupCount=settings.LOG_BACKUP_COUNT, encoding="utf8")
+
 def setup_logging():
+    global _listener
+    stop_logging()
+
     logging_config = {
         "version": 1,
         "disable_existing_loggers": False,
-        "formatters": {
-            "default": {
-                "format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-            },
-            "access": {
-                "format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-            },
-        },
-        "handlers": {
-            "console": {
-                "formatter": "default",
-                "class": "logging.StreamHandler",
-                "stream": sys.stdout,
-            },
-            "file": {
-                "formatter": "default",
-                "class": "logging.FileHandler",
-                "filename": "app.log",
-                "encoding": "utf8",
-            },
-        },
         "loggers": {
             "": {
-                "handlers": ["console", "file"],
                 "level": settings.LOG_LEVEL,
             },
             "uvicorn.error": {
                 "level": "INFO",
             },
             "uvicorn.access": {
-                "handlers": ["console"],
                 "level": "INFO",
                 "propagate": False,
             },
+            # Logs every statement at DEBUG
+            "aiosqlite": {
+                "level": "INFO",
+            },
         },
     }
     logging.config.dictConfig(logging_config)
+
+    if settings.LOG_FORMAT == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(formatter)
+    file = _file_handler()
+    file.setFormatter(formatter)
+
+    log_queue = queue.Queue(-1)
+    _listener = logging.handlers.QueueListener(log_queue, console, file, respect_handler_level=True)
+    _listener.start()
+
+    handler = _QueueHandler(log_queue)
+    if settings.LOG_SAMPLE_RATES:
+        handler.addFilter(SamplingFilter(settings.LOG_SAMPLE_RATES))
+    for name in ("", "uvicorn.access"):
+        logger = logging.getLogger(name)
+        for old in [h for h in logger.handlers if isinstance(h, logging.handlers.QueueHandler)]:
+            logger.removeHandler(old)
+        logger.addHandler(handler)
+
+def stop_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+atexit.register(stop_logging)
@@ -1,14 +1,146 @@
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Optional, Tuple
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.executors import run_in_thread
 from app.services.appointment_flow import AppointmentBookingFlow
 
-# In-memory session store for tracking appointment flows across multiple routers
+# Session stores for tracking appointment flows across multiple routers
 # Key: user_id (int), Value: AppointmentBookingFlow instance
-booking_sessions = {}
 
-def get_or_create_session(user_id: int) -> AppointmentBookingFlow:
-    if user_id not in booking_sessions:
-        booking_sessions[user_id] = AppointmentBookingFlow()
-    return booking_sessions[user_id]
+class SessionStore(ABC):
+    """
+    Interface for booking-session storage. Flows returned by `get` are
+    working copies: call `save` after mutating one so every backend (and
+    every worker sharing it) sees the new state.
+
+    Stores that do I/O set `blocking`; the async helpers below then run
+    their calls on the thread pool instead of the event loop.
+    """
+
+    blocking = False
+
+    @abstractmethod
+    def get(self, user_id: int) -> Optional[AppointmentBookingFlow]:
+        ...
+
+    @abstractmethod
+    def save(self, user_id: int, flow: AppointmentBookingFlow):
+        ...
+
+    @abstractmethod
+    def delete(self, user_id: int):
+        ...
+
+    def __contains__(self, user_id: int) -> bool:
+        return self.get(user_id) is not None
+
+class MemorySessionStore(SessionStore):
+    """Per-process store, bounded by entry count and idle TTL."""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 3600):
+        self._cache = TTLCache(max_size=max_entries, ttl=ttl_seconds)
+
+    def get(self, user_id):
+        return self._cache.get(user_id)
+
+    def save(self, user_id, flow):
+        # Re-inserting refreshes both the LRU position and the TTL
+        self._cache.set(user_id, flow)
+
+    def delete(self, user_id):
+        self._cache.pop(user_id)
+
+    def __len__(self):
+        return len(self._cache)
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Store shared by every worker on the host through one SQLite file in WAL
+    mode, so concurrent readers never block the writer. Flow state is kept
+    in the flow's compact `to_bytes()` form; rows idle for longer than the
+    TTL are treated as gone and purged periodically.
+    """
+
+    PURGE_INTERVAL = 60.0
+    blocking = True  # lock waits of up to `timeout` seconds
+
+    def __init__(self, path: str = "./sessions.db", ttl_seconds: float = 3600):
+        self.ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS booking_sessions ("
+            "user_id INTEGER PRIMARY KEY, state BLOB NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def get(self, user_id):
+        with self._lock:
+            self._maybe_purge()
+            row = self._conn.execute(
+                "SELECT state FROM booking_sessions WHERE user_id = ? AND updated_at > ?",
+                (user_id, time.time() - self.ttl)
+            ).fetchone()
+        return AppointmentBookingFlow.from_bytes(row[0]) if row else None
+
+    def save(self, user_id, flow):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO booking_sessions (user_id, state, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+                (user_id, flow.to_bytes(), time.time())
+            )
+
+    def delete(self, user_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM booking_sessions WHERE user_id = ?", (user_id,))
+
+    def _maybe_purge(self):
+        now = time.time()
+        if now - self._last_purge >= self.PURGE_INTERVAL:
+            self._last_purge = now
+            self._conn.execute("DELETE FROM booking_sessions WHERE updated_at <= ?", (now - self.ttl,))
+
+    def close(self):
+        self._conn.close()
+
+def create_session_store() -> SessionStore:
+    if settings.SESSION_BACKEND == "sqlite":
+        return SQLiteSessionStore(settings.SESSION_DB_PATH, ttl_seconds=settings.SESSION_TTL_SECONDS)
+    if settings.SESSION_BACKEND == "memory":
+        return MemorySessionStore(settings.SESSION_MAX_ENTRIES, ttl_seconds=settings.SESSION_TTL_SECONDS)
+    raise ValueError(f"Unknown SESSION_BACKEND '{settings.SESSION_BACKEND}'")
+
+session_store = create_session_store()
+
+async def _call(func, *args):
+    if session_store.blocking:
+        return await run_in_thread(func, *args)
+    return func(*args)
+
+async def get_session(user_id: int) -> Optional[AppointmentBookingFlow]:
+    return await _call(session_store.get, user_id)
+
+async def get_or_create_session(user_id: int) -> Tuple[AppointmentBookingFlow, bool]:
+    """
+    (flow, created) with a single store lookup. A new flow is not stored
+    until the caller saves it, so callers that only wanted to know whether
+    a session exists can drop it for free.
+    """
+    flow = await get_session(user_id)
+    if flow is None:
+        return AppointmentBookingFlow(), True
+    return flow, False
+
+async def save_session(user_id: int, flow: AppointmentBookingFlow):
+    await _call(session_store.save, user_id, flow)
 
-def delete_session(user_id: int):
-    if user_id in booking_sessions:
-        booking_sessions.pop(user_id)
+async def delete_session(user_id: int):
+    await _call(session_store.delete, user_id)
@@ -0,0 +1,91 @@
+import argparse
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class Readiness:
+    """Tracks whether every model has been loaded and how long each took."""
+
+    def __init__(self):
+        self.ready = False
+        self.models = {}
+        self.error = None
+
+    def as_dict(self) -> dict:
+        return {
+            "status": "ready" if self.ready else "starting",
+            "models": self.models,
+            "error": self.error
+        }
+
+readiness = Readiness()
+
+def _warm_intent_classifier():
+    from app.routers.chat import intent_classifier
+    # Trains and saves the model here (not inside a request) if the .pkl is missing
+    intent_classifier.load_model()
+    intent_classifier.predict_batch(["warm up"])
+
+def _warm_sentiment_analyzer():
+    from app.services.cpu_stages import sentiment_analyzer
+    # The VADER lexicon is read on construction; one scoring pass touches the rest
+    sentiment_analyzer.sia.polarity_scores("warm up")
+
+WARMUP_STEPS = {
+    "intent_classifier": _warm_intent_classifier,
+    "sentiment_analyzer": _warm_sentiment_analyzer,
+}
+
+def warm_up_models(state: Readiness = readiness) -> Readiness:
+    """
+    Load every model used by the request path so the first request does not
+    pay for deserialization or training. Run once from the app lifespan.
+    """
+    state.ready = False
+    state.error = None
+    for name, step in WARMUP_STEPS.items():
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            state.error = f"{name}: {e}"
+            logger.exception("Warm-up failed for %s", name)
+            raise
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+        state.models[name] = {"loaded": True, "load_ms": elapsed_ms}
+        logger.info("Warmed up %s in %sms", name, elapsed_ms)
+
+    state.ready = True
+    return state
+
+def build_models(force: bool = False):
+    """
+    Produce all model artifacts offline (e.g. during the image build) so a
+    fresh pod only ever loads them. Existing artifacts are kept unless `force`.
+    """
+    from app.core.config import settings
+    from app.services.intent_classifier import IntentClassifier
+    from app.services.topic_modeler import TopicModeler
+    # Importing the analyzer fetches the VADER lexicon if it is missing
+    import app.services.sentiment_analyzer  # noqa: F401
+
+    intent_classifier = IntentClassifier(backend=settings.INTENT_BACKEND)
+    topic_modeler = TopicModeler()
+    if force:
+        intent_classifier.train()
+        topic_modeler.train()
+    else:
+        intent_classifier.load_model()
+        topic_modeler.load_model()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or warm up Medsy models.")
+    parser.add_argument("--build", action="store_true", help="build any missing model artifacts")
+    parser.add_argument("--force", action="store_true", help="with --build, retrain even if artifacts exist")
+    args = parser.parse_args()
+
+    if args.build:
+        build_models(force=args.force)
+    else:
+        print(warm_up_models().as_dict())
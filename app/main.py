@@ -1,17 +1,47 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.core.config import settings
 from app.routers import chat, appointments, voice, reports
 from app.core.logging_config import setup_logging
+from app.core.warmup import readiness, warm_up_models
+from app.core.executors import start_executors, shutdown_executors
+from app.core.metrics import MetricsMiddleware, render_prometheus
+from app.core.db import init_db, dispose_engine
+from app.routers.chat import ai_generator
+from app.services.chat_history import chat_history
+from app.routers.voice import voice_service
 
 # Setup logging
 setup_logging()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load every model before the server starts accepting traffic
+    if settings.WARMUP_ON_STARTUP:
+        warm_up_models()
+    else:
+        readiness.ready = True
+    start_executors()
+    await init_db()
+    chat_history.start()
+    yield
+    await chat_history.stop()
+    await ai_generator.aclose()
+    voice_service.shutdown()
+    shutdown_executors()
+    await dispose_engine()
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(chat.router, prefix=settings.API_V1_STR)
 app.include_router(appointments.router, prefix=settings.API_V1_STR)
@@ -21,3 +51,16 @@ app.include_router(reports.router, prefix=settings.API_V1_STR)
 @app.get("/")
 async def root():
     return {"message": "Welcome to Med Companion API"}
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once all models are loaded, 503 before that."""
+    return JSONResponse(
+        status_code=200 if readiness.ready else 503,
+        content=readiness.as_dict()
+    )
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
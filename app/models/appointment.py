@@ -1,15 +1,21 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from app.models.base import Base
 
 class Appointment(Base):
     __tablename__ = "appointments"
+    __table_args__ = (
+        # A user's upcoming/past appointments, optionally by status
+        Index("ix_appointments_user_date_status", "user_id", "date", "status"),
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    appointment_id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.user_id"))
+    date = Column(DateTime)
+    status = Column(String, default="Scheduled") # Scheduled, Completed, Cancelled
+    problem_category = Column(String)
+    description = Column(Text)
     doctor_name = Column(String, index=True)
-    appointment_date = Column(DateTime, index=True)
-    reason = Column(String)
-    status = Column(String, default="scheduled") # scheduled, completed, cancelled
+    location = Column(String)
 
-    owner = relationship("User", backref="appointments")
+    user = relationship("User", back_populates="appointments")
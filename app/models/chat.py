@@ -1,15 +1,20 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
-from sqlalchemy.sql import func
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from app.models.base import Base
 
 class ChatHistory(Base):
     __tablename__ = "chat_history"
+    __table_args__ = (
+        # Per-user history, newest first, without scanning other users' rows
+        Index("ix_chat_history_user_timestamp", "user_id", "timestamp"),
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    message = Column(String)
-    sender = Column(String) # 'user' or 'bot'
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    message_id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.user_id"))
+    message_text = Column(Text)
+    sender = Column(String) # "user" or "bot"
+    intent_detected = Column(String)
+    timestamp = Column(DateTime, default=datetime.utcnow)
 
-    owner = relationship("User", backref="chats")
+    user = relationship("User", back_populates="chat_history")
@@ -1,25 +1,36 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Text, Index
 from sqlalchemy.orm import relationship
 from app.models.base import Base
 
 class Symptom(Base):
     __tablename__ = "symptoms"
+    __table_args__ = (
+        # A user's symptom log in time order
+        Index("ix_symptoms_user_logged_at", "user_id", "logged_at"),
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    name = Column(String, index=True)
-    severity = Column(String) # mild, moderate, severe
-    description = Column(String, nullable=True)
+    symptom_id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.user_id"))
+    symptom_name = Column(String, index=True)
+    severity = Column(Integer) # 1-10
+    description = Column(Text, nullable=True)
+    start_date = Column(DateTime)
+    frequency = Column(String)
+    logged_at = Column(DateTime, default=datetime.utcnow)
 
-    owner = relationship("User", backref="symptoms")
+    user = relationship("User", back_populates="medical_records")
 
 class Medication(Base):
     __tablename__ = "medications"
 
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    medication_id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.user_id"), index=True)
     name = Column(String, index=True)
     dosage = Column(String)
     frequency = Column(String)
+    start_date = Column(DateTime)
+    instructions = Column(String)
+    adherence_rate = Column(Float, default=0.0)
 
-    owner = relationship("User", backref="medications")
+    user = relationship("User", back_populates="medications")
@@ -0,0 +1,162 @@
+"""
+Schema migrations for the application database.
+
+`upgrade(conn)` brings any database up to SCHEMA_VERSION: it creates
+missing tables, then applies each numbered migration that has not been
+recorded in the `schema_version` table yet. It takes a synchronous
+Connection inside a transaction; `migrate(conn)` wraps it with the
+SQLite settings the table rebuilds need, and the async app runs that
+through `conn.run_sync(migrate)`.
+
+Run manually with:
+    python -m app.models.migrations
+"""
+import logging
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+
+from app.models import Base
+
+logger = logging.getLogger(__name__)
+
+_version_table = Table(
+    "schema_version", MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, default=datetime.utcnow),
+)
+
+# Old `app/models/*.py` layout (users.id, message, ...) -> current columns.
+# Keys are current column names, values are the legacy columns they take.
+LEGACY_COLUMNS = {
+    "users": {
+        "user_id": "id", "name": "full_name", "email": "email",
+        "hashed_password": "hashed_password", "phone": "phone_number", "created_at": "created_at",
+    },
+    "appointments": {
+        "appointment_id": "id", "user_id": "user_id", "doctor_name": "doctor_name",
+        "date": "appointment_date", "description": "reason", "status": "status",
+    },
+    "symptoms": {
+        "symptom_id": "id", "user_id": "user_id", "symptom_name": "name", "description": "description",
+    },
+    "medications": {
+        "medication_id": "id", "user_id": "user_id", "name": "name", "dosage": "dosage", "frequency": "frequency",
+    },
+    "chat_history": {
+        "message_id": "id", "user_id": "user_id", "message_text": "message",
+        "sender": "sender", "timestamp": "timestamp",
+    },
+}
+
+def _rebuild_legacy_tables(conn):
+    """Copy tables created with the old `id`-keyed layout into the current one."""
+    inspector = inspect(conn)
+    existing = set(inspector.get_table_names())
+    rebuilt = []
+    for name, mapping in LEGACY_COLUMNS.items():
+        if name not in existing:
+            continue
+        columns = {col["name"] for col in inspector.get_columns(name)}
+        new_pk = next(iter(mapping))
+        if new_pk in columns or "id" not in columns:
+            continue
+
+        legacy = f"_legacy_{name}"
+        # Index names would clash with the ones the new table creates
+        for index in inspector.get_indexes(name):
+            conn.execute(text(f'DROP INDEX IF EXISTS "{index["name"]}"'))
+        conn.execute(text(f'ALTER TABLE "{name}" RENAME TO "{legacy}"'))
+        Base.metadata.tables[name].create(conn)
+
+        pairs = [(new, old) for new, old in mapping.items() if old in columns]
+        targets = ", ".join(f'"{new}"' for new, _ in pairs)
+        sources = ", ".join(f'"{old}"' for _, old in pairs)
+        conn.execute(text(f'INSERT INTO "{name}" ({targets}) SELECT {sources} FROM "{legacy}"'))
+        conn.execute(text(f'DROP TABLE "{legacy}"'))
+        logger.info("Migrated legacy table %s", name)
+        rebuilt.append(name)
+
+    if rebuilt and conn.dialect.name == "sqlite":
+        _check_foreign_keys(conn, rebuilt)
+
+def _check_foreign_keys(conn, tables):
+    """Fail the migration, before it commits, if a rebuilt row is orphaned."""
+    # The legacy app never enforced users.id, so rows can name users that
+    # were never stored; give them a bare account rather than drop history.
+    for name in tables:
+        if name != "users" and "user_id" in Base.metadata.tables[name].c:
+            conn.execute(text(
+                f'INSERT INTO users (user_id) SELECT DISTINCT user_id FROM "{name}" '
+                f'WHERE user_id IS NOT NULL AND user_id NOT IN (SELECT user_id FROM users)'
+            ))
+    violations = conn.exec_driver_sql("PRAGMA foreign_key_check").fetchall()
+    if violations:
+        raise RuntimeError(f"Legacy table rebuild left broken foreign keys: {violations[:5]}")
+
+def _create_query_indexes(conn):
+    """Composite indexes for tables created before they were declared."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+# (version, name, step); append new migrations, never renumber
+MIGRATIONS = (
+    (1, "rebuild_legacy_tables", _rebuild_legacy_tables),
+    (2, "query_indexes", _create_query_indexes),
+)
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def current_version(conn) -> int:
+    _version_table.create(conn, checkfirst=True)
+    versions = [row[0] for row in conn.execute(select(_version_table.c.version))]
+    return max(versions, default=0)
+
+def upgrade(conn) -> int:
+    """Apply pending migrations in order; returns the resulting version."""
+    version = current_version(conn)
+    # Tables that already exist (possibly in a legacy shape) are left to the migrations
+    Base.metadata.create_all(conn)
+    for number, name, step in MIGRATIONS:
+        if number <= version:
+            continue
+        step(conn)
+        conn.execute(_version_table.insert().values(version=number, name=name, applied_at=datetime.utcnow()))
+        logger.info("Applied migration %d (%s)", number, name)
+        version = number
+    return version
+
+def migrate(conn) -> int:
+    """
+    Run `upgrade` in its own transaction on a connection outside one.
+
+    On SQLite the rebuilds need foreign key enforcement off (children point
+    at the renamed table while it is copied) and `legacy_alter_table` on
+    (so RENAME does not repoint them at `_legacy_*`). Neither pragma can be
+    changed inside a transaction, so they are set around it and restored
+    afterwards; `_check_foreign_keys` verifies the result before commit.
+    """
+    if conn.dialect.name != "sqlite":
+        with conn.begin():
+            return upgrade(conn)
+
+    enforced = conn.exec_driver_sql("PRAGMA foreign_keys").scalar()
+    conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+    conn.exec_driver_sql("PRAGMA legacy_alter_table=ON")
+    conn.commit()
+    try:
+        with conn.begin():
+            return upgrade(conn)
+    finally:
+        conn.exec_driver_sql("PRAGMA legacy_alter_table=OFF")
+        conn.exec_driver_sql(f"PRAGMA foreign_keys={'ON' if enforced else 'OFF'}")
+        conn.commit()
+
+if __name__ == "__main__":
+    import asyncio
+    from app.core.db import init_db
+
+    asyncio.run(init_db())
+    print(f"Database is at schema version {SCHEMA_VERSION}")
@@ -1,13 +1,25 @@
+from datetime import datetime
 from sqlalchemy import Column, Integer, String, DateTime
-from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
 from app.models.base import Base
 
 class User(Base):
     __tablename__ = "users"
 
-    id = Column(Integer, primary_key=True, index=True)
-    full_name = Column(String, index=True)
+    user_id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, index=True)
     email = Column(String, unique=True, index=True)
-    hashed_password = Column(String)
-    phone_number = Column(String, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    hashed_password = Column(String, nullable=True)
+    phone = Column(String)
+    date_of_birth = Column(DateTime)
+    gender = Column(String)
+    emergency_contact = Column(String)
+    insurance_info = Column(String)
+    preferred_language = Column(String, default="en")
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_login = Column(DateTime)
+
+    appointments = relationship("Appointment", back_populates="user")
+    medical_records = relationship("Symptom", back_populates="user")
+    medications = relationship("Medication", back_populates="user")
+    chat_history = relationship("ChatHistory", back_populates="user")
@@ -1,11 +1,17 @@
-from fastapi import APIRouter, HTTPException
+import time
+from fastapi import APIRouter, Depends, HTTPException, Response
 from pydantic import BaseModel
 from typing import Optional, List
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.db import get_db
 from app.services.appointment_flow import AppointmentBookingFlow
 
 router = APIRouter(prefix="/appointments", tags=["appointments"])
 
-from app.core.sessions import get_or_create_session, delete_session
+from app.core.metrics import timed
+from app.core.sessions import get_or_create_session, save_session, delete_session
+from app.services.persistence import save_appointment
+from app.services.context_builder import context_builder
 
 class BookingRequest(BaseModel):
     user_id: int
@@ -17,21 +23,25 @@ class BookingResponse(BaseModel):
     options: List[str] = []
 
 @router.post("/process", response_model=BookingResponse)
-async def process_booking(request: BookingRequest):
+async def process_booking(request: BookingRequest, http_response: Response, db: AsyncSession = Depends(get_db)):
     user_id = request.user_id
     
     # Retrieve or create session via shared store
-    flow = get_or_create_session(user_id)
+    flow, _ = await get_or_create_session(user_id)
+    was_completed = flow.state == AppointmentBookingFlow.COMPLETED
     
     # Process input
-    result = flow.process_input(request.message)
+    start = time.perf_counter()
+    with timed("process_input"):
+        result = flow.process_input(request.message)
+    await save_session(user_id, flow)
+    http_response.headers["Server-Timing"] = f"process_input;dur={(time.perf_counter() - start) * 1000:.2f}"
     
-    # If completed, maybe save to DB and clear session
-    if result['state'] == "COMPLETED":
-        # Save to DB logic here
-        # db.add(Appointment(...))
-        # booking_sessions.pop(user_id) # Optional: keep for history
-        pass
+    # Persist the booking once, on the step that confirms it; the session is
+    # kept so the user can still ask for the details
+    if result['state'] == AppointmentBookingFlow.COMPLETED and not was_completed:
+        await save_appointment(db, user_id, flow)
+        context_builder.invalidate(user_id)
         
     return BookingResponse(
         response=result['response'],
@@ -41,5 +51,5 @@ async def process_booking(request: BookingRequest):
 
 @router.delete("/reset/{user_id}")
 async def reset_booking(user_id: int):
-    delete_session(user_id)
+    await delete_session(user_id)
     return {"message": "Booking session reset"}
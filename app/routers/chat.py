@@ -1,24 +1,104 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
 from pydantic import BaseModel
-from typing import Optional
-from app.services.sentiment_analyzer import SentimentAnalyzer
+from typing import List, Optional, Literal
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.services.intent_classifier import IntentClassifier
 from app.services.ai_generator import AIGenerator
-from app.services.emergency_detector import EmergencyDetector
-from app.core.sessions import get_or_create_session, delete_session, booking_sessions
+from app.services.cpu_stages import analyze_sentiment, check_emergency
+from app.services.micro_batcher import MicroBatcher
+from app.services.analysis_graph import AnalysisGraph, Stage
+from app.core.config import settings
+from app.core.executors import run_in_thread, run_in_process
+from app.core.metrics import timed, INTENT_BATCH_SIZE
+from app.core.db import get_db, db_session
+from app.services.persistence import save_appointment
+from app.services.chat_history import chat_history, fetch_history
+from app.services.context_builder import EMPTY_CONTEXT, context_builder
+from app.services.llm_backend import create_llm_backend
+from app.services.response_rules import ResponseRuleEngine
+from app.core.sessions import get_or_create_session, save_session, delete_session
 from app.services.appointment_flow import AppointmentBookingFlow
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
 # Initialize services
-sentiment_analyzer = SentimentAnalyzer()
-intent_classifier = IntentClassifier()
-ai_generator = AIGenerator()
-emergency_detector = EmergencyDetector()
+intent_classifier = IntentClassifier(backend=settings.INTENT_BACKEND)
+ai_generator = AIGenerator(
+    cache_size=settings.RESPONSE_CACHE_SIZE,
+    cache_ttl=settings.RESPONSE_CACHE_TTL_SECONDS,
+    backend=create_llm_backend(),
+    rules=ResponseRuleEngine.from_file(settings.RESPONSE_RULES_PATH) if settings.RESPONSE_RULES_PATH else None
+)
+
+def _predict_batch(messages: list) -> list:
+    INTENT_BATCH_SIZE.observe(len(messages))
+    with timed("predict"):
+        return intent_classifier.predict_batch(messages)
+
+# Concurrent /chat/ requests share one predict_batch call
+intent_batcher = MicroBatcher(
+    _predict_batch,
+    max_batch_size=settings.INTENT_BATCH_MAX_SIZE,
+    max_wait_ms=settings.INTENT_BATCH_WAIT_MS,
+    runner=run_in_thread
+)
+
+# Per-request analysis stages. Nothing runs until a branch asks for it.
+# Timers wrap the awaited call so they also cover process-pool stages
+async def _emergency_stage(inputs):
+    with timed("check_symptoms"):
+        return await run_in_process(check_emergency, inputs["message"])
+
+async def _intent_stage(inputs):
+    return await intent_batcher.submit(inputs["message"])
+
+async def _sentiment_stage(inputs):
+    with timed("analyze"):
+        return await run_in_process(analyze_sentiment, inputs["message"])
+
+async def _context_stage(inputs):
+    with timed("build_context"):
+        return await context_builder.build(inputs["user_id"])
+
+async def _response_stage(inputs, sentiment):
+    # Keyword replies ignore context, so this branch skips the lookups. They
+    # stay in this process: the response cache and rule-hit counters live here
+    with timed("generate_response"):
+        return await run_in_thread(ai_generator.generate_response, inputs["message"], EMPTY_CONTEXT, sentiment)
+
+async def _llm_response_stage(inputs, sentiment, context):
+    with timed("generate_response"):
+        # Network-bound: awaited on the loop, never holding a worker
+        return await ai_generator.agenerate_response(inputs["message"], context, sentiment)
+
+CHAT_STAGES = [
+    Stage("emergency", _emergency_stage),
+    Stage("intent", _intent_stage),
+    Stage("sentiment", _sentiment_stage),
+    Stage("context", _context_stage),
+    Stage("response", _response_stage, requires=("sentiment",)),
+    Stage("llm_response", _llm_response_stage, requires=("sentiment", "context")),
+]
+
+def _response_stage_name() -> str:
+    """Only an LLM backend reads the context, so only it pulls in that stage."""
+    return "llm_response" if ai_generator.backend is not None else "response"
+
+async def _generator_context(graph: AnalysisGraph) -> str:
+    if ai_generator.backend is None:
+        return EMPTY_CONTEXT
+    return await graph.get("context")
 
 class ChatRequest(BaseModel):
     user_id: Optional[int] = 1
     message: str
+    # "full" = everything, "summary" = no raw VADER scores, "none" = empty sentiment
+    sentiment_detail: Literal["full", "summary", "none"] = "full"
 
 class ChatResponse(BaseModel):
     response: str
@@ -26,37 +106,69 @@ class ChatResponse(BaseModel):
     intent: dict
     is_emergency: bool
 
-@router.post("/", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest):
+def _shape_sentiment(sentiment: dict, detail: str) -> dict:
+    if detail == "none" or not sentiment:
+        return {}
+    if detail == "summary":
+        return {k: v for k, v in sentiment.items() if k != "raw_scores"}
+    return sentiment
+
+async def _sentiment_for_response(graph: AnalysisGraph, detail: str) -> dict:
+    # Branches that only echo sentiment back skip the stage when it isn't wanted
+    if detail == "none":
+        return {}
+    return _shape_sentiment(await graph.get("sentiment"), detail)
+
+def _start_analysis(request: ChatRequest) -> AnalysisGraph:
+    graph = AnalysisGraph(CHAT_STAGES, message=request.message, user_id=request.user_id)
+    # Emergency decides whether anything else is needed; it is a cheap
+    # keyword scan, so it runs alone rather than racing work it may discard
+    graph.start("emergency")
+    return graph
+
+async def _route_message(request: ChatRequest, graph: AnalysisGraph, db: AsyncSession):
+    """
+    Handle the emergency and booking branches. Returns (response, intent);
+    response is None when the message falls through to AI generation.
+    """
     message = request.message
     user_id = request.user_id
+    detail = request.sentiment_detail
     
     # 1. Emergency Check
-    emergency_status = emergency_detector.check_symptoms(message)
+    emergency_status = await graph.get("emergency")
     if emergency_status['is_emergency']:
+        intent = {"intent": "emergency_alert", "confidence": 1.0}
         return ChatResponse(
             response=emergency_status['alert_message'] + " " + emergency_status['action_required'],
             sentiment={},
-            intent={"intent": "emergency_alert", "confidence": 1.0},
+            intent=intent,
             is_emergency=True
-        )
+        ), intent
+
+    # Not an emergency: intent and (if wanted) sentiment are independent, run them together
+    graph.start("intent")
+    if detail != "none":
+        graph.start("sentiment")
 
     # 2. Appointment Flow Check
     # If the user is already in a session OR the intent is to book
-    intent = intent_classifier.predict(message)
+    intent = await graph.get("intent")
     
-    if user_id in booking_sessions or intent['intent'] == "book_appointment":
-        flow = get_or_create_session(user_id)
-        
+    # One store lookup; a flow that was only just created is dropped unsaved
+    flow, created = await get_or_create_session(user_id)
+    if not created or intent['intent'] == "book_appointment":
         # If the session was already completed, and user is NOT trying to book again,
         # clear it so they can go back to general chat.
         if flow.state == AppointmentBookingFlow.COMPLETED and intent['intent'] != "book_appointment":
             # Don't delete if they are just asking to see current details
             if not any(word in message.lower() for word in ["show", "detail", "summary", "appointment", "view"]):
-                delete_session(user_id)
+                await delete_session(user_id)
             else:
                 # Process the "show details" request
-                result = flow.process_input(message)
+                with timed("process_input"):
+                    result = flow.process_input(message)
+                await save_session(user_id, flow)
                 response_text = result['response']
                 intent['options'] = result.get('options', [])
                 intent['state'] = result.get('state')
@@ -65,12 +177,18 @@ async def chat_endpoint(request: ChatRequest):
                 
                 return ChatResponse(
                     response=response_text,
-                    sentiment=sentiment_analyzer.analyze(message),
+                    sentiment=await _sentiment_for_response(graph, detail),
                     intent=intent,
                     is_emergency=False
-                )
+                ), intent
         else:
-            result = flow.process_input(message)
+            was_completed = flow.state == AppointmentBookingFlow.COMPLETED
+            with timed("process_input"):
+                result = flow.process_input(message)
+            await save_session(user_id, flow)
+            if flow.state == AppointmentBookingFlow.COMPLETED and not was_completed:
+                await save_appointment(db, user_id, flow)
+                context_builder.invalidate(user_id)
             response_text = result['response']
             intent['options'] = result.get('options', [])
             intent['state'] = result.get('state')
@@ -80,20 +198,116 @@ async def chat_endpoint(request: ChatRequest):
             
             return ChatResponse(
                 response=response_text,
-                sentiment=sentiment_analyzer.analyze(message),
+                sentiment=await _sentiment_for_response(graph, detail),
                 intent=intent,
                 is_emergency=False
-            )
+            ), intent
 
-    # 3. Standard Sentiment Analysis
-    sentiment = sentiment_analyzer.analyze(message)
-    
+    return None, intent
+
+def _server_timing(timings: dict) -> str:
+    """Format stage durations (ms) as a Server-Timing header value."""
+    return ", ".join(f"{name};dur={ms:.2f}" for name, ms in timings.items())
+
+@router.post("/", response_model=ChatResponse)
+async def chat_endpoint(request: ChatRequest, http_response: Response, db: AsyncSession = Depends(get_db)):
+    graph = _start_analysis(request)
+    response, intent = await _route_message(request, graph, db)
+    if response is not None:
+        await chat_history.add(request.user_id, request.message, response.response, intent['intent'])
+        http_response.headers["Server-Timing"] = _server_timing(graph.timings)
+        return response
+
+    # 3. Sentiment feeds the generator, so this branch always needs it
     # 4. Generate AI Response for general queries
-    response_text = ai_generator.generate_response(message, "No context yet", sentiment)
+    sentiment, response_text = await graph.gather("sentiment", _response_stage_name())
+    await chat_history.add(request.user_id, request.message, response_text, intent['intent'])
+    http_response.headers["Server-Timing"] = _server_timing(graph.timings)
     
     return ChatResponse(
         response=response_text,
-        sentiment=sentiment,
+        sentiment=_shape_sentiment(sentiment, request.sentiment_detail),
         intent=intent,
         is_emergency=False
     )
+
+def _ndjson(event: dict) -> bytes:
+    return (json.dumps(event) + "\n").encode("utf-8")
+
+async def _stream_events(request: ChatRequest, db: AsyncSession):
+    graph = _start_analysis(request)
+    response, intent = await _route_message(request, graph, db)
+    if response is not None:
+        # Emergency and booking replies are already complete
+        yield _ndjson({"type": "meta", "sentiment": response.sentiment, "intent": intent, "is_emergency": response.is_emergency})
+        yield _ndjson({"type": "token", "text": response.response})
+        yield _ndjson({"type": "done"})
+        await chat_history.add(request.user_id, request.message, response.response, intent['intent'])
+        return
+
+    sentiment, context = await asyncio.gather(graph.get("sentiment"), _generator_context(graph))
+    yield _ndjson({
+        "type": "meta",
+        "sentiment": _shape_sentiment(sentiment, request.sentiment_detail),
+        "intent": intent,
+        "is_emergency": False
+    })
+    chunks = []
+    try:
+        if ai_generator.backend is not None:
+            tokens = ai_generator.astream_response(request.message, context, sentiment)
+        else:
+            tokens = iterate_in_threadpool(ai_generator.stream_response(request.message, context, sentiment))
+        async for token in tokens:
+            chunks.append(token)
+            yield _ndjson({"type": "token", "text": token})
+    except Exception as e:
+        yield _ndjson({"type": "error", "detail": str(e)})
+    yield _ndjson({"type": "done"})
+    await chat_history.add(request.user_id, request.message, "".join(chunks), intent['intent'])
+
+@router.post("/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """
+    Streaming variant of /chat/ as newline-delimited JSON. The first event
+    carries the emergency/intent/sentiment verdict ("meta"), followed by
+    "token" events as the reply text is produced and a final "done".
+    """
+    async def events():
+        # Own session: the stream outlives the request's dependencies
+        async with db_session() as db:
+            async for event in _stream_events(request, db):
+                yield event
+
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        # Ask reverse proxies not to buffer the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+class HistoryTurn(BaseModel):
+    message_id: Optional[int]
+    sender: str
+    message: Optional[str]
+    intent: Optional[str]
+    timestamp: datetime
+
+class HistoryPage(BaseModel):
+    items: List[HistoryTurn]
+    next_cursor: Optional[str] = None
+
+@router.get("/history/{user_id}", response_model=HistoryPage)
+async def chat_history_endpoint(
+    user_id: int,
+    limit: int = Query(20, ge=1, le=settings.CHAT_HISTORY_PAGE_MAX),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """A page of the user's conversation, newest first; pass next_cursor back for older turns."""
+    # Turns still in the write-behind buffer become visible after its next flush
+    try:
+        items, next_cursor = await fetch_history(db, user_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return HistoryPage(items=items, next_cursor=next_cursor)
@@ -1,23 +1,155 @@
-from fastapi import APIRouter, File, UploadFile
-import shutil
 import os
-# from app.services.voice_handler import VoiceHandler
+import wave
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response
+from pydantic import BaseModel, Field
+from starlette.datastructures import UploadFile
+from app.core.cache import DiskLRUCache
+from app.core.config import settings
+from app.core.executors import run_in_thread
+from app.services.analysis_graph import AnalysisGraph
+from app.services.voice_service import (
+    AudioTooLarge, EnergyVAD, StreamingTranscriber, VoiceBusy, VoiceService, create_stt_engine, create_tts_engine
+)
+from app.routers.chat import CHAT_STAGES
 
 router = APIRouter(prefix="/voice", tags=["voice"])
 
-@router.post("/transcribe")
-async def transcribe_audio(file: UploadFile = File(...)):
+voice_service = VoiceService(
+    create_stt_engine(settings.VOICE_STT_ENGINE),
+    workers=settings.VOICE_WORKERS,
+    max_queue=settings.VOICE_MAX_QUEUE,
+    max_upload_bytes=settings.VOICE_MAX_UPLOAD_BYTES,
+    spool_max_bytes=settings.VOICE_SPOOL_MAX_BYTES,
+    tts_engine=create_tts_engine(settings.TTS_ENGINE),
+    tts_cache=DiskLRUCache(settings.TTS_CACHE_DIR, settings.TTS_CACHE_MAX_BYTES, suffix=".wav"),
+    default_voice=settings.TTS_DEFAULT_VOICE,
+    default_rate=settings.TTS_DEFAULT_RATE,
+)
+
+class SpeakRequest(BaseModel):
+    text: str = Field(..., min_length=1, max_length=settings.TTS_MAX_CHARS)
+    voice: Optional[str] = None
+    rate: Optional[int] = Field(None, ge=50, le=400)
+
+# Headroom for the multipart boundaries and part headers around the audio
+MULTIPART_OVERHEAD_BYTES = 16 * 1024
+
+_TRANSCRIBE_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["file"],
+            "properties": {"file": {"type": "string", "format": "binary"}},
+        }}},
+    }
+}
+
+@router.post("/transcribe", openapi_extra=_TRANSCRIBE_BODY)
+async def transcribe_audio(request: Request):
     """
     Endpoint to receive audio blob from frontend and transcribe it.
+
+    The form is parsed here rather than through a `File()` parameter so an
+    oversized upload is refused from its Content-Length before any of the
+    body is read; `transcribe_upload` still enforces the limit on what
+    actually arrives (e.g. chunked uploads without a length).
+    """
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > voice_service.max_upload_bytes + MULTIPART_OVERHEAD_BYTES:
+        raise HTTPException(status_code=413, detail="Audio upload too large")
+    form = await request.form(max_files=1, max_fields=1)
+    file = form.get("file")
+    if not isinstance(file, UploadFile):
+        await form.close()
+        raise HTTPException(status_code=422, detail="Expected an audio file in the 'file' field")
+    try:
+        text = await voice_service.transcribe_upload(file)
+    except VoiceBusy:
+        raise HTTPException(status_code=503, detail="Transcription queue is full", headers={"Retry-After": "1"})
+    except AudioTooLarge:
+        raise HTTPException(status_code=413, detail="Audio upload too large")
+    except (wave.Error, EOFError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Unreadable audio: {e}")
+    return {"transcription": text}
+
+@router.post("/speak")
+async def speak(request: SpeakRequest):
+    """
+    Synthesize `text` to WAV. Audio is cached on disk, so repeated replies
+    (canned answers, booking prompts) are served straight from the file.
+    """
+    try:
+        path = await voice_service.synthesize(request.text, request.voice, request.rate)
+        try:
+            audio = await run_in_thread(_read_file, path)
+        except FileNotFoundError:
+            # Evicted between the lookup and the read; the cache now misses
+            path = await voice_service.synthesize(request.text, request.voice, request.rate)
+            audio = await run_in_thread(_read_file, path)
+    except VoiceBusy:
+        raise HTTPException(status_code=503, detail="Speech synthesis queue is full", headers={"Retry-After": "1"})
+    # Read up front rather than streamed from the path, so a later eviction
+    # can't remove the file mid-response; the file name is the cache key
+    etag = os.path.splitext(os.path.basename(path))[0]
+    return Response(audio, media_type="audio/wav", headers={"ETag": f'"{etag}"'})
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+async def _with_analysis(event: dict, user_id: int) -> dict:
+    """Run emergency and intent on a finished utterance before the user stops talking."""
+    if event["type"] != "final" or not event["text"].strip():
+        return event
+    graph = AnalysisGraph(CHAT_STAGES, message=event["text"], user_id=user_id)
+    emergency, intent = await graph.gather("emergency", "intent")
+    event["is_emergency"] = emergency["is_emergency"]
+    event["intent"] = intent
+    return event
+
+@router.websocket("/stream")
+async def transcribe_stream(websocket: WebSocket, sample_rate: int = Query(16000, ge=8000, le=48000), user_id: int = 1):
+    """
+    Incremental transcription. The client sends binary frames of 16-bit
+    little-endian mono PCM at `sample_rate` while the user speaks, then the
+    text message "end". The server answers with JSON events:
+    {"type": "partial", "text"} while an utterance is in progress and
+    {"type": "final", "text", "is_emergency", "intent"} after each pause.
     """
-    # Save temp file
-    temp_filename = f"temp_{file.filename}"
-    with open(temp_filename, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
-    # In production:
-    # text = voice_handler.transcribe_file(temp_filename)
-    # os.remove(temp_filename)
-    # return {"transcription": text}
-    
-    return {"transcription": "This is a placeholder for server-side transcription."}
+    await websocket.accept()
+    transcriber = StreamingTranscriber(
+        voice_service,
+        sample_rate=sample_rate,
+        vad=EnergyVAD(sample_rate, threshold=settings.VOICE_VAD_THRESHOLD),
+        hangover_ms=settings.VOICE_VAD_HANGOVER_MS,
+        partial_interval_ms=settings.VOICE_PARTIAL_INTERVAL_MS,
+        max_utterance_ms=settings.VOICE_MAX_UTTERANCE_MS,
+    )
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            ending = message.get("text") == "end"
+            try:
+                if ending:
+                    events = await transcriber.finish()
+                elif message.get("bytes"):
+                    events = await transcriber.feed(message["bytes"])
+                else:
+                    continue
+            except VoiceBusy:
+                events = [{"type": "error", "detail": "Transcription queue is full"}]
+            except (wave.Error, EOFError, ValueError) as e:
+                events = [{"type": "error", "detail": f"Unreadable audio: {e}"}]
+            for event in events:
+                await websocket.send_json(await _with_analysis(event, user_id))
+            if ending:
+                await websocket.close()
+                return
+    except WebSocketDisconnect:
+        pass
@@ -1,28 +1,128 @@
 import os
+import re
+from app.core.cache import TTLCache
+from app.core.metrics import REGISTRY
+from app.services.context_builder import EMPTY_CONTEXT
+from app.services.llm_backend import BackendUnavailable
+from app.services.response_rules import ResponseRuleEngine
 # from openai import OpenAI # Uncomment in production
 
+RESPONSE_CACHE_REQUESTS = REGISTRY.counter(
+    "medsy_response_cache_requests_total", "Generator response cache lookups.", ["result"])
+
+# Context strings that carry nothing the reply could depend on
+_EMPTY_CONTEXTS = (None, "", EMPTY_CONTEXT)
+
+def _words(text):
+    """Split a finished reply into word pieces, keeping whitespace."""
+    for match in re.finditer(r"\S+\s*", text):
+        yield match.group(0)
+
 class AIGenerator:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, cache_size=2048, cache_ttl=3600, backend=None, rules=None):
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
-        # self.client = OpenAI(api_key=self.api_key) if self.api_key else None
+        # Canned replies for the keyword fallback (see response_rules.py)
+        self.rules = rules or ResponseRuleEngine()
+        # Async LLMBackend (see llm_backend.py); None serves the keyword replies
+        self.backend = backend
+        # Replies to repeated messages ("hi", "I have a fever") are reused
+        self.cache = TTLCache(max_size=cache_size, ttl=cache_ttl) if cache_size > 0 else None
 
-    def generate_response(self, user_text, context, sentiment=None):
-        """
-        Generate an empathetic response using LLM.
-        """
+    @staticmethod
+    def anxiety_bucket(sentiment) -> int:
+        """The part of the sentiment that changes the system prompt."""
+        return 1 if sentiment and sentiment.get('anxiety_level', 0) > 5 else 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(re.findall(r"[a-z0-9']+", text.lower()))
+
+    def _system_prompt(self, sentiment) -> str:
         # Prompt engineering
         system_prompt = (
             "You are Medsy, an empathetic and professional medical assistant. "
             "Your goal is to help patients feel calm and understood. "
             "Keep responses concise (under 50 words) unless explaining a complex topic."
         )
-        
-        if sentiment and sentiment.get('anxiety_level', 0) > 5:
+        if self.anxiety_bucket(sentiment):
             system_prompt += " The user seems anxious. Be extra reassuring."
+        return system_prompt
+
+    def _cache_key(self, user_text, context, sentiment, cacheable):
+        # The mock replies ignore context; an LLM reply depends on it
+        uses_context = self.backend is not None or bool(self.api_key)
+        if not cacheable or self.cache is None or (uses_context and context not in _EMPTY_CONTEXTS):
+            return None
+        return (self.normalize(user_text), self.anxiety_bucket(sentiment))
+
+    def _cached(self, key):
+        if key is None:
+            return None
+        cached = self.cache.get(key)
+        RESPONSE_CACHE_REQUESTS.inc(result="miss" if cached is None else "hit")
+        if cached is None:
+            return None
+        reply, rule = cached
+        if rule is not None:
+            # The rule engine is skipped on a hit; still count the rule it served
+            self.rules.record(rule)
+        return reply
+
+    def _store(self, key, reply, rule=None):
+        """Cache `reply` with the name of the rule that produced it (None for LLM text)."""
+        if key is not None:
+            self.cache.set(key, (reply, rule))
+
+    def generate_response(self, user_text, context, sentiment=None, cacheable=True):
+        """
+        Generate an empathetic response using LLM.
+
+        Replies are cached on (normalized text, anxiety bucket). Pass
+        `cacheable=False` for replies that must not be shared; replies an
+        LLM builds from a non-empty context are never cached.
+        """
+        key = self._cache_key(user_text, context, sentiment, cacheable)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        reply, rule, ok = self._generate(user_text, context, sentiment)
+        if ok:
+            self._store(key, reply, rule)
+        return reply
+
+    async def agenerate_response(self, user_text, context, sentiment=None, cacheable=True):
+        """
+        Non-blocking variant that calls the async backend. If the backend is
+        unavailable (timeouts, open circuit, saturation) the keyword reply
+        is served instead, and not cached.
+        """
+        if self.backend is None:
+            return self.generate_response(user_text, context, sentiment, cacheable)
+        key = self._cache_key(user_text, context, sentiment, cacheable)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        try:
+            reply = await self.backend.complete(self._system_prompt(sentiment), f"Context: {context}\nUser: {user_text}")
+        except BackendUnavailable:
+            return self._mock_response(user_text, sentiment)
+        self._store(key, reply)
+        return reply
+
+    async def aclose(self):
+        if self.backend is not None:
+            await self.backend.aclose()
+
+    def _generate(self, user_text, context, sentiment):
+        """
+        Returns (reply, rule, ok): `rule` names the canned reply used (None
+        for LLM text); ok is False for the apology served on errors.
+        """
+        system_prompt = self._system_prompt(sentiment)
 
         # Mock response if no API key
         if not self.api_key:
-            return self._mock_response(user_text, sentiment)
+            return (*self._mock_reply(user_text), True)
 
         try:
             # response = self.client.chat.completions.create(
@@ -33,56 +133,60 @@ class AIGenerator:
             #     ]
             # )
             # return response.choices[0].message.content
-            return self._mock_response(user_text, sentiment) # Fallback
+            return (*self._mock_reply(user_text), True) # Fallback
             
         except Exception as e:
             print(f"AI Generation Error: {e}")
-            return "I apologize, I'm having trouble connecting to my brain right now. How else can I help?"
+            return "I apologize, I'm having trouble connecting to my brain right now. How else can I help?", None, False
+
+    def stream_response(self, user_text, context, sentiment=None, cacheable=True):
+        """
+        Yield the reply word by word (keeping whitespace). This is the
+        keyword/mock path: the reply is complete before the first word is
+        yielded, which is instant for canned replies. Real token streaming
+        is astream_response with a backend.
+        """
+        yield from _words(self.generate_response(user_text, context, sentiment, cacheable))
+
+    async def astream_response(self, user_text, context, sentiment=None, cacheable=True):
+        """
+        Forward the backend's deltas as the LLM produces them. Cached and
+        keyword replies (no backend, cache hit, backend unavailable before
+        any text) are split into words instead. Streamed replies are cached
+        once complete.
+        """
+        if self.backend is None:
+            for piece in self.stream_response(user_text, context, sentiment, cacheable):
+                yield piece
+            return
+        key = self._cache_key(user_text, context, sentiment, cacheable)
+        cached = self._cached(key)
+        if cached is not None:
+            for piece in _words(cached):
+                yield piece
+            return
+        parts = []
+        try:
+            async for delta in self.backend.stream(self._system_prompt(sentiment), f"Context: {context}\nUser: {user_text}"):
+                parts.append(delta)
+                yield delta
+        except BackendUnavailable:
+            if parts:
+                # Part of the reply is already out; a canned reply won't fit after it
+                return
+            for piece in _words(self._mock_response(user_text, sentiment)):
+                yield piece
+            return
+        self._store(key, "".join(parts))
+
+    def _mock_reply(self, text):
+        """(reply, rule name) from the compiled rule table."""
+        name, reply = self.rules.reply(text)
+        return reply, name
 
     def _mock_response(self, text, sentiment):
-        """Robust keyword-based response system for high-quality fallback."""
-        text = text.lower()
-        
-        # 1. Greetings & Meta
-        if any(w in text for w in ["hello", "hi", "hey", "greetings"]):
-            return "Hello! I'm Medsy, your medical companion. How can I help you today? I can help with symptom checking, booking appointments, or medication info."
-        
-        if any(w in text for w in ["who are you", "what can you do", "help", "guide"]):
-            return ("I am Medsy, an AI-powered health assistant. You can ask me about:\n"
-                    "• Common symptoms (cough, fever, etc.)\n"
-                    "• Booking medical appointments\n"
-                    "• Understanding your medications\n"
-                    "• Emergency detection")
-
-        # 2. Symptom Deep-Dive
-        if any(w in text for w in ["cold", "cough", "flu", "sneeze"]):
-            return ("It sounds like you might be dealing with a viral infection. Common symptoms include coughing, congestion, and a sore throat. "
-                    "Most viral colds resolve on their own with rest and fluids. Would you like to book a checkup to be sure?")
-        
-        if any(w in text for w in ["fever", "temp", "hot", "shiver"]):
-            return ("A fever is usually a sign of your immune system fighting an infection. For adults, a high fever is generally above 103°F (39.4°C). "
-                    "Make sure to stay hydrated. If the fever persists for more than 3 days, please schedule a visit.")
-
-        if any(w in text for w in ["pain", "hurt", "ache"]):
-            if "chest" in text:
-                return "URGENT: Since you mentioned chest pain, please sit down and rest. If it's severe or radiating, call emergency services immediately."
-            return "I'm sorry you're in pain. For minor aches, rest and over-the-counter relief can help, but recurring pain should be examined by a professional."
-
-        # 3. Medications
-        if any(w in text for w in ["medicine", "pill", "drug", "tablet", "dosage"]):
-            return ("Medication should always be taken exactly as prescribed by your doctor. "
-                    "Would you like me to look up information on a specific drug like Paracetamol or Ibuprofen?")
-
-        # 4. Appointments
-        if any(w in text for w in ["appointment", "book", "see a doctor", "visit"]):
-            return "I can certainly help you with that! Just say 'I want to book an appointment' and I'll start the scheduling process for you."
-
-        # 5. Default "Help Menu" Fallback (Proper Fix for repetition)
-        return ("I'm not exactly sure how to help with that yet. You can try asking:\n"
-                "• 'What are cold symptoms?'\n"
-                "• 'I want to book an appointment'\n"
-                "• 'I have a fever'\n"
-                "• 'Tell me about medications'")
+        """Keyword-based fallback reply from the compiled rule table."""
+        return self._mock_reply(text)[0]
 
     def generate_symptom_report(self, symptom_log):
         """
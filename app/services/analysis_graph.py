@@ -0,0 +1,73 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Tuple
+
+
+class Stage:
+    """
+    One node of an analysis graph. `func(inputs, **deps)` returns an
+    awaitable; `deps` holds the results of the stages named in `requires`.
+    """
+
+    def __init__(self, name: str, func: Callable[..., Awaitable], requires: Tuple[str, ...] = ()):
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+
+
+class AnalysisGraph:
+    """
+    Per-request, on-demand evaluation of a set of stages.
+
+    A stage only runs when something asks for its result (directly or as a
+    dependency), and at most once. Stages started together run concurrently,
+    so independent work overlaps while work the chosen branch never needs
+    is never executed.
+    """
+
+    def __init__(self, stages: Iterable[Stage], **inputs):
+        self.stages: Dict[str, Stage] = {stage.name: stage for stage in stages}
+        self.inputs = inputs
+        self.timings: Dict[str, float] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def start(self, *names: str):
+        """Schedule stages (and their dependencies) without waiting for them."""
+        for name in names:
+            self._task(name)
+
+    async def get(self, name: str):
+        return await self._task(name)
+
+    async def gather(self, *names: str) -> list:
+        return list(await asyncio.gather(*(self._task(name) for name in names)))
+
+    def cancel_pending(self):
+        """
+        Stop awaiting stages that are no longer needed. Best-effort: work
+        already handed to an executor runs to completion regardless, so
+        don't start stages that may be thrown away.
+        """
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
+
+    def _task(self, name: str) -> asyncio.Task:
+        task = self._tasks.get(name)
+        if task is None:
+            if name not in self.stages:
+                raise KeyError(f"Unknown analysis stage '{name}'")
+            task = asyncio.ensure_future(self._run(self.stages[name]))
+            self._tasks[name] = task
+        return task
+
+    async def _run(self, stage: Stage):
+        deps = {}
+        if stage.requires:
+            results = await asyncio.gather(*(self._task(dep) for dep in stage.requires))
+            deps = dict(zip(stage.requires, results))
+
+        start = time.perf_counter()
+        result = await stage.func(self.inputs, **deps)
+        self.timings[stage.name] = (time.perf_counter() - start) * 1000
+        return result
@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+import json
 import random
 
 class AppointmentBookingFlow:
@@ -10,24 +11,75 @@ class AppointmentBookingFlow:
     FILE_UPLOAD = "FILE_UPLOAD"
     CONFIRMATION = "CONFIRMATION"
     COMPLETED = "COMPLETED"
+    STATES = (INITIATE, PROBLEM_SELECTION, DATE_SELECTION, TIME_SELECTION, FILE_UPLOAD, CONFIRMATION, COMPLETED)
+
+    # Shared by every session instead of being copied into each one
+    COMMON_PROBLEMS = (
+        "General checkup", "Fever/Cold", "Headache/Migraine", 
+        "Stomach pain", "Chest pain", "Skin problems", 
+        "Joint/Muscle pain", "Allergies", "Diabetes check", 
+        "BP Check", "Women's health", "Mental health", 
+        "Injury", "Follow-up", "Other"
+    )
+    _PROBLEMS_LOWER = tuple((prob.lower(), prob) for prob in COMMON_PROBLEMS)
+    common_problems = COMMON_PROBLEMS
+
+    PATIENT_NAME = "Sah Krishna" # Mock from session/user
+    LOCATION = "Medsy Wellness Center, Block C"
+    DOCTOR = "Dr. Shrestha (General Physician)"
+
+    # Per-session state only; no instance __dict__
+    __slots__ = ("state", "problem", "date", "time", "files", "has_reports", "booking_id")
 
     def __init__(self):
         self.state = self.INITIATE
-        self.booking_data = {
-            "problem": None,
-            "date": None,
-            "time": None,
-            "files": [],
-            "id": None
+        self.problem = None
+        self.date = None
+        self.time = None
+        self.files = ()
+        self.has_reports = None
+        self.booking_id = None
+
+    @property
+    def booking_data(self) -> dict:
+        """Booking details in the shape the API returns to the frontend."""
+        data = {
+            "problem": self.problem,
+            "date": self.date,
+            "time": self.time,
+            "files": list(self.files),
+            "id": self.booking_id
         }
-        self.common_problems = [
-            "General checkup", "Fever/Cold", "Headache/Migraine", 
-            "Stomach pain", "Chest pain", "Skin problems", 
-            "Joint/Muscle pain", "Allergies", "Diabetes check", 
-            "BP Check", "Women's health", "Mental health", 
-            "Injury", "Follow-up", "Other"
+        if self.has_reports is not None:
+            data["has_reports"] = self.has_reports
+        if self.booking_id is not None:
+            data["patient_name"] = self.PATIENT_NAME
+            data["location"] = self.LOCATION
+            data["doctor"] = self.DOCTOR
+        return data
+
+    def to_state(self) -> list:
+        """Compact positional snapshot: [state index, problem, date, time, has_reports, id, files]."""
+        return [
+            self.STATES.index(self.state), self.problem, self.date, self.time,
+            self.has_reports, self.booking_id, list(self.files)
         ]
 
+    @classmethod
+    def from_state(cls, state: list) -> "AppointmentBookingFlow":
+        flow = cls.__new__(cls)
+        state_idx, flow.problem, flow.date, flow.time, flow.has_reports, flow.booking_id, files = state
+        flow.state = cls.STATES[state_idx]
+        flow.files = tuple(files)
+        return flow
+
+    def to_bytes(self) -> bytes:
+        return json.dumps(self.to_state(), separators=(",", ":")).encode("utf-8")
+
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> "AppointmentBookingFlow":
+        return cls.from_state(json.loads(payload))
+
     def process_input(self, user_input: str) -> dict:
         """
         Process user input based on current state.
@@ -40,12 +92,12 @@ class AppointmentBookingFlow:
         if self.state == self.INITIATE:
             self.state = self.PROBLEM_SELECTION
             response = "I'll help you book an appointment. Let's start with your main concern. Please choose from the list or say it."
-            options = self.common_problems
+            options = list(self.COMMON_PROBLEMS)
             
         elif self.state == self.PROBLEM_SELECTION:
             # Simple matching or fallback
             selection = self._match_problem(user_input)
-            self.booking_data["problem"] = selection
+            self.problem = selection
             self.state = self.DATE_SELECTION
             response = f"Okay, checking for {selection}. When would you like to come in?"
             
@@ -58,25 +110,25 @@ class AppointmentBookingFlow:
             
         elif self.state == self.DATE_SELECTION:
             # In a real app, use dateparser logic
-            self.booking_data["date"] = user_input # Placeholder
+            self.date = user_input # Placeholder
             self.state = self.TIME_SELECTION
             response = f"Got it, {user_input}. What time works best? We have slots in Morning, Afternoon, or Evening."
             options = ["Morning", "Afternoon", "Evening"]
             
         elif self.state == self.TIME_SELECTION:
-            self.booking_data["time"] = user_input
+            self.time = user_input
             self.state = self.FILE_UPLOAD
             response = "Noted. Do you have any medical reports or files to share?"
             options = ["Yes", "No"]
             
         elif self.state == self.FILE_UPLOAD:
             if "no" in user_input.lower():
-                self.booking_data["has_reports"] = False
+                self.has_reports = False
                 self.state = self.CONFIRMATION
                 return self.process_input("") 
             
             elif "yes" in user_input.lower():
-                self.booking_data["has_reports"] = True
+                self.has_reports = True
                 response = "Great! Please use the button below or the 📎 icon to upload your medical reports. Click 'See Summary' when you are done."
                 options = ["See Summary"]
                 return {
@@ -97,10 +149,7 @@ class AppointmentBookingFlow:
                 return self.process_input("")
             
         elif self.state == self.CONFIRMATION:
-            self.booking_data["id"] = f"APT-{random.randint(1000,9999)}"
-            self.booking_data["patient_name"] = "Sah Krishna" # Mock from session/user
-            self.booking_data["location"] = "Medsy Wellness Center, Block C"
-            self.booking_data["doctor"] = "Dr. Shrestha (General Physician)"
+            self.booking_id = f"APT-{random.randint(1000,9999)}"
             
             summary = "Your appointment has been successfully scheduled! Here are your complete details:"
             response = summary
@@ -136,8 +185,8 @@ class AppointmentBookingFlow:
     def _match_problem(self, input_text):
         """Simple fuzzy match attempt or return input"""
         input_text = input_text.lower()
-        for prob in self.common_problems:
-            if prob.lower() in input_text:
+        for prob_lower, prob in self._PROBLEMS_LOWER:
+            if prob_lower in input_text:
                 return prob
             # Handle numeric selection "number 1" or "option 1"
             # (Simplification: assuming user says text for now)
@@ -0,0 +1,206 @@
+import asyncio
+import base64
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import and_, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.db import db_session
+from app.core.metrics import REGISTRY, timed
+from app.models import ChatHistory
+from app.services.persistence import ensure_users
+
+logger = logging.getLogger(__name__)
+
+CHAT_ROWS_DROPPED = REGISTRY.counter(
+    "medsy_chat_history_dropped_rows_total", "Chat rows lost because a flush failed.")
+
+def encode_cursor(timestamp: datetime, message_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{message_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError on a malformed cursor."""
+    try:
+        timestamp, _, message_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").partition("|")
+        return datetime.fromisoformat(timestamp), int(message_id)
+    except (UnicodeError, ValueError, TypeError) as e:
+        raise ValueError(f"Invalid history cursor: {cursor!r}") from e
+
+def _as_turn(row: ChatHistory) -> dict:
+    return {
+        "message_id": row.message_id,
+        "sender": row.sender,
+        "message": row.message_text,
+        "intent": row.intent_detected,
+        "timestamp": row.timestamp,
+    }
+
+async def fetch_history(db: AsyncSession, user_id: int, limit: int = 20, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    One page of a user's chat history, newest first, using keyset pagination
+    on (timestamp, message_id) so each page is an index range scan on
+    ix_chat_history_user_timestamp however deep the user pages. Returns
+    (turns, next_cursor); next_cursor is None on the last page.
+    """
+    query = select(ChatHistory).where(ChatHistory.user_id == user_id)
+    if cursor:
+        timestamp, message_id = decode_cursor(cursor)
+        query = query.where(or_(
+            ChatHistory.timestamp < timestamp,
+            and_(ChatHistory.timestamp == timestamp, ChatHistory.message_id < message_id)
+        ))
+    query = query.order_by(ChatHistory.timestamp.desc(), ChatHistory.message_id.desc()).limit(limit + 1)
+    rows = (await db.execute(query)).scalars().all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].message_id)
+    return [_as_turn(row) for row in rows], next_cursor
+
+def _as_turn_dict(row: dict) -> dict:
+    return {
+        "message_id": None,  # assigned on flush
+        "sender": row["sender"],
+        "message": row["message_text"],
+        "intent": row["intent_detected"],
+        "timestamp": row["timestamp"],
+    }
+
+class ChatHistoryBuffer:
+    """
+    Write-behind buffer for chat_history rows.
+
+    Once started, `add` only enqueues; a background task flushes rows with
+    one multi-row INSERT whenever `max_batch` rows are waiting or every
+    `flush_interval` seconds. The queue is bounded, so when the database
+    falls behind `add` waits for room instead of growing without limit.
+    Before `start` (and after `stop`) rows are written through immediately.
+
+    It also keeps the last `recent_turns` rows of recently active users in
+    memory, updated on every `add`, so building generator context doesn't
+    cost a query per message.
+
+    `session_factory` is an async context manager factory yielding an
+    AsyncSession, e.g. `app.core.db.db_session`.
+    """
+
+    def __init__(self, session_factory: Callable, max_batch: int = 500, flush_interval: float = 1.0, max_queue: int = 10000,
+                 recent_turns: int = 10, recent_users: int = 10000):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.recent_turns = recent_turns
+        self._recent = TTLCache(max_size=recent_users)
+        self._queue: Optional[asyncio.Queue] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def add(self, user_id: int, message: str, response: str, intent: Optional[str] = None):
+        """Record one chat turn: the user's message and the bot's reply."""
+        now = datetime.utcnow()
+        rows = [
+            {"user_id": user_id, "message_text": message, "sender": "user", "intent_detected": intent, "timestamp": now},
+            {"user_id": user_id, "message_text": response, "sender": "bot", "intent_detected": intent, "timestamp": now},
+        ]
+        recent = self._recent.get(user_id)
+        if recent is not None:
+            # Only extend windows loaded from the database; a partial one
+            # would hide older turns
+            recent.extend(_as_turn_dict(row) for row in rows)
+        if not self.running:
+            await self._write(rows)
+            return
+        for row in rows:
+            await self._queue.put(row)  # blocks while the queue is full
+        if self._queue.qsize() >= self.max_batch:
+            self._wake.set()
+
+    async def recent(self, user_id: int) -> List[dict]:
+        """The user's last `recent_turns` rows, oldest first."""
+        window = self._recent.get(user_id)
+        if window is None:
+            async with self.session_factory() as db:
+                turns, _ = await fetch_history(db, user_id, limit=self.recent_turns)
+            window = deque(reversed(turns), maxlen=self.recent_turns)
+            self._recent.set(user_id, window)
+        return list(window)
+
+    def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write everything still queued."""
+        if not self.running:
+            return
+        self._stopping = True
+        self._wake.set()
+        await self._task
+        self._task = None
+
+    async def flush(self):
+        while self._queue is not None and not self._queue.empty():
+            batch = self._take(self.max_batch)
+            await self._write(batch)
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+        # Rows queued while the last flush was running
+        await self.flush()
+
+    def _take(self, limit: int) -> List[dict]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _write(self, rows: List[dict]):
+        try:
+            with timed("chat_history_flush"):
+                async with self.session_factory() as db:
+                    await ensure_users(db, {row["user_id"] for row in rows})
+                    await db.execute(insert(ChatHistory), rows)
+                    await db.commit()
+        except Exception:
+            # Chat history is not worth failing a request or killing the flusher over
+            CHAT_ROWS_DROPPED.inc(len(rows))
+            logger.exception("Failed to write %d chat_history rows", len(rows))
+
+# Shared by the chat and appointment routers; started from the app lifespan
+chat_history = ChatHistoryBuffer(
+    db_session,
+    max_batch=settings.CHAT_HISTORY_BATCH_SIZE,
+    flush_interval=settings.CHAT_HISTORY_FLUSH_SECONDS,
+    max_queue=settings.CHAT_HISTORY_MAX_QUEUE,
+    recent_turns=settings.CHAT_CONTEXT_TURNS,
+    recent_users=settings.CHAT_RECENT_CACHE_USERS
+)
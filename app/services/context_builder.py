@@ -0,0 +1,150 @@
+import re
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.db import db_session
+from app.core.sessions import get_session
+from app.models import Appointment, Medication
+from app.services.chat_history import chat_history
+
+# Word pieces of up to 4 characters plus single punctuation marks: close
+# enough to BPE token counts for budgeting, and a single regex pass.
+_TOKEN_RE = re.compile(r"\w{1,4}|[^\w\s]")
+
+EMPTY_CONTEXT = "No context yet"
+PROFILE_HEADER = "Patient context:"
+TURNS_HEADER = "Recent conversation:"
+
+def count_tokens(text: str) -> int:
+    """Approximate token count of `text`."""
+    return len(_TOKEN_RE.findall(text))
+
+def clip_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut `text` after roughly `max_tokens` tokens."""
+    if max_tokens <= 0:
+        return ""
+    for i, match in enumerate(_TOKEN_RE.finditer(text)):
+        if i == max_tokens:
+            return text[:match.start()].rstrip() + "…"
+    return text
+
+class ContextBuilder:
+    """
+    Assembles the `context` string passed to AIGenerator: the patient's
+    booking state, upcoming appointment and current medications, followed
+    by as many recent conversation turns (newest kept first) as fit in
+    `max_tokens`.
+
+    The profile part is cached per user for `profile_ttl` seconds (call
+    `invalidate` after changing it), and each rendered turn is memoised
+    with its token count, so a new message only costs rendering the turns
+    added since the previous call.
+    """
+
+    def __init__(self, history, session_factory: Callable, max_tokens: int = 512,
+                 booking_lookup: Optional[Callable] = None, profile_ttl: float = 300, max_users: int = 10000):
+        self.history = history
+        self.session_factory = session_factory
+        self.max_tokens = max_tokens
+        self.booking_lookup = booking_lookup  # async: user_id -> booking flow or None
+        self._profiles = TTLCache(max_size=max_users, ttl=profile_ttl)
+        self._turns = TTLCache(max_size=max_users)
+
+    async def build(self, user_id: int) -> str:
+        budget = self.max_tokens
+        lines = []
+
+        profile = await self._booking_lines(user_id) + await self._profile_lines(user_id)
+        if profile:
+            lines.append(PROFILE_HEADER)
+            budget -= count_tokens(PROFILE_HEADER)
+            for line in profile:
+                tokens = count_tokens(line)
+                if tokens > budget:
+                    break
+                lines.append(line)
+                budget -= tokens
+
+        turns = self._render_turns(user_id, await self.history.recent(user_id))
+        budget -= count_tokens(TURNS_HEADER)
+        kept = []
+        for line, tokens in reversed(turns):
+            if tokens > budget:
+                if not kept and budget > 1:
+                    # Always keep (part of) the latest turn; the ellipsis costs a token
+                    kept.append(clip_to_tokens(line, budget - 1))
+                break
+            kept.append(line)
+            budget -= tokens
+        if kept:
+            lines.append(TURNS_HEADER)
+            lines.extend(reversed(kept))
+
+        return "\n".join(lines) if lines else EMPTY_CONTEXT
+
+    def invalidate(self, user_id: int):
+        """Drop the cached profile, e.g. after a booking is saved."""
+        self._profiles.pop(user_id)
+
+    async def _booking_lines(self, user_id: int) -> List[str]:
+        flow = await self.booking_lookup(user_id) if self.booking_lookup else None
+        if flow is None or flow.state == flow.INITIATE:
+            return []
+        details = ", ".join(f"{k} {v}" for k, v in (("problem", flow.problem), ("date", flow.date), ("time", flow.time)) if v)
+        return [f"- Booking {flow.state.lower().replace('_', ' ')}" + (f": {details}" if details else "")]
+
+    async def _profile_lines(self, user_id: int) -> List[str]:
+        lines = self._profiles.get(user_id)
+        if lines is not None:
+            return lines
+
+        async with self.session_factory() as db:
+            appointment = (await db.execute(
+                select(Appointment)
+                .where(Appointment.user_id == user_id, Appointment.status == "Scheduled", Appointment.date >= datetime.now())
+                .order_by(Appointment.date)
+                .limit(1)
+            )).scalar_one_or_none()
+            medications = (await db.execute(
+                select(Medication).where(Medication.user_id == user_id).order_by(Medication.name)
+            )).scalars().all()
+
+        lines = []
+        if appointment is not None:
+            lines.append(f"- Upcoming appointment: {appointment.problem_category} on "
+                         f"{appointment.date:%Y-%m-%d %H:%M} with {appointment.doctor_name}")
+        for med in medications:
+            dose = " ".join(filter(None, [med.dosage, f"({med.frequency})" if med.frequency else None]))
+            lines.append(f"- Takes {med.name}" + (f" {dose}" if dose else ""))
+        self._profiles.set(user_id, lines)
+        return lines
+
+    def _render_turns(self, user_id: int, turns: List[dict]) -> List[Tuple[str, int]]:
+        memo = self._turns.get(user_id) or {}
+        current = {}
+        rendered = []
+        for turn in turns:
+            key = (turn["timestamp"], turn["sender"], len(turn["message"] or ""))
+            entry = memo.get(key)
+            if entry is None:
+                line = f"{'User' if turn['sender'] == 'user' else 'Medsy'}: {turn['message']}"
+                entry = (line, count_tokens(line))
+            current[key] = entry
+            rendered.append(entry)
+        # Only the current window is kept, so the memo never grows
+        self._turns.set(user_id, current)
+        return rendered
+
+# Shared by the chat and appointment routers
+context_builder = ContextBuilder(
+    chat_history,
+    db_session,
+    max_tokens=settings.CONTEXT_MAX_TOKENS,
+    booking_lookup=get_session,
+    profile_ttl=settings.CONTEXT_PROFILE_TTL_SECONDS,
+    max_users=settings.CHAT_RECENT_CACHE_USERS
+)
@@ -0,0 +1,20 @@
+"""
+Pure-Python analysis stages that the chat path may ship to the process pool.
+
+Worker processes import only this module (see PROCESS_POOL_PRELOAD), so they
+build the NLP singletons below and nothing else: no session store, LLM
+client or database engine. Keep these functions free of metric updates;
+counters incremented in a worker never reach the parent's /metrics, so
+the callers time and count around the awaited call instead.
+"""
+from app.services.emergency_detector import EmergencyDetector
+from app.services.sentiment_analyzer import SentimentAnalyzer
+
+sentiment_analyzer = SentimentAnalyzer()
+emergency_detector = EmergencyDetector()
+
+def check_emergency(message: str) -> dict:
+    return emergency_detector.check_symptoms(message)
+
+def analyze_sentiment(message: str) -> dict:
+    return sentiment_analyzer.analyze(message)
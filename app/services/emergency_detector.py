@@ -1,4 +1,5 @@
 from datetime import datetime
+from app.services.phrase_matcher import PhraseMatcher
 
 class EmergencyDetector:
     def __init__(self):
@@ -39,32 +40,39 @@ class EmergencyDetector:
             "bleeding": 7, "high fever": 5, "seizure": 10
         }
 
+        # Every rule's symptom list plus the severity table compiled into one automaton
+        self.matcher = PhraseMatcher(self.keyword_tables())
+
+    def keyword_tables(self) -> dict:
+        tables = {f"rule:{condition}": criteria["symptoms"] for condition, criteria in self.rules.items()}
+        tables["symptom_scores"] = list(self.symptom_scores)
+        return tables
+
     def check_symptoms(self, message: str) -> dict:
         """
-        Analyze a message string for emergency conditions.
-        Returns a dict with alert status and details.
+        Analyze a message string (or a list of symptom strings) for emergency
+        conditions. Returns a dict with alert status and details.
         """
-        message = message.lower()
+        if isinstance(message, (list, tuple)):
+            message = ", ".join(message)
+        hits = self.matcher.hits_by_table(message)
         detected_conditions = []
         max_severity = 0
         
         # Rule-based check
         for condition, criteria in self.rules.items():
-            match_count = 0
-            for crit_symptom in criteria["symptoms"]:
-                if crit_symptom in message:
-                    match_count += 1
+            match_count = len(hits.get(f"rule:{condition}", ()))
             
             if match_count >= criteria["required_count"]:
                 detected_conditions.append(condition)
                 max_severity = max(max_severity, criteria["severity_base"])
 
         # Individual severe symptom check
-        for symptom, score in self.symptom_scores.items():
-            if symptom in message:
-                max_severity = max(max_severity, score)
-                if score >= 9:
-                    detected_conditions.append(f"Critical Symptom: {symptom}")
+        for symptom in hits.get("symptom_scores", ()):
+            score = self.symptom_scores[symptom]
+            max_severity = max(max_severity, score)
+            if score >= 9:
+                detected_conditions.append(f"Critical Symptom: {symptom}")
 
         is_emergency = max_severity >= 8 or len(detected_conditions) > 0
         
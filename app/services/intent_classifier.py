@@ -1,14 +1,27 @@
+import numpy as np
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
 from sklearn.pipeline import Pipeline
 import joblib
 import os
 import random
 
 class IntentClassifier:
-    def __init__(self, model_path="app/models/intent_model.pkl"):
-        self.model_path = model_path
+    # Classifier heads that can sit behind the shared TF-IDF features.
+    # "linear" scores a whole batch with a single sparse matrix product.
+    BACKENDS = {
+        "forest": lambda: RandomForestClassifier(n_estimators=100, random_state=42),
+        "linear": lambda: LogisticRegression(max_iter=1000, C=10.0),
+    }
+
+    def __init__(self, model_path=None, backend="forest"):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown intent backend '{backend}'. Choose from {list(self.BACKENDS)}")
+        self.backend = backend
+        suffix = "" if backend == "forest" else f"_{backend}"
+        self.model_path = model_path or f"app/models/intent_model{suffix}.pkl"
         self.model = None
         self._initialize_data()
         
@@ -98,10 +111,10 @@ class IntentClassifier:
         
         pipeline = Pipeline([
             ('tfidf', TfidfVectorizer(stop_words='english', token_pattern=r'\b\w+\b')),
-            ('clf', RandomForestClassifier(n_estimators=100, random_state=42))
+            ('clf', self.BACKENDS[self.backend]())
         ])
         
-        print(f"Training on {len(df)} examples...")
+        print(f"Training {self.backend} model on {len(df)} examples...")
         pipeline.fit(df['text'], df['intent'])
         self.model = pipeline
         
@@ -124,15 +137,27 @@ class IntentClassifier:
         """
         Predict the intent of the given text.
         """
+        return self.predict_batch([text])[0]
+
+    def predict_batch(self, texts) -> list:
+        """
+        Predict intents for many texts with one vectorizer/classifier call.
+        """
+        texts = list(texts)
+        if not texts:
+            return []
         if self.model is None:
             self.load_model()
-            
-        probas = self.model.predict_proba([text])[0]
-        max_proba_idx = probas.argmax()
-        intent = self.model.classes_[max_proba_idx]
-        confidence = probas[max_proba_idx]
-        
-        return {
-            "intent": intent,
-            "confidence": round(confidence, 2)
-        }
+
+        probas = self.model.predict_proba(texts)
+        best = probas.argmax(axis=1)
+        confidences = probas[np.arange(len(texts)), best]
+        classes = self.model.classes_
+
+        return [
+            {
+                "intent": str(classes[idx]),
+                "confidence": round(float(conf), 2)
+            }
+            for idx, conf in zip(best, confidences)
+        ]
@@ -1,49 +1,81 @@
-import re
-from functools import lru_cache
+import csv
+import json
+from app.services.phrase_matcher import PhraseMatcher
+
+DEFAULT_GLOSSARY = {
+    "hypertension": "High blood pressure",
+    "acute": "Sudden, recent onset",
+    "chronic": "Long-lasting condition, continuing for a long time",
+    "benign": "Not harmful or cancerous",
+    "malignant": "Harmful, likely cancerous",
+    "edema": "Swelling caused by fluid trapped in your body's tissues",
+    "idiopathic": "Of unknown cause",
+    "myocardial infarction": "Heart attack",
+    "cerebrovascular accident": "Stroke",
+    "dyspnea": "Shortness of breath or difficulty breathing",
+    "bradycardia": "Slower than normal heart rate",
+    "tachycardia": "Faster than normal heart rate",
+    "analgesic": "Pain reliever",
+    "anti-inflammatory": "Reduces swelling and inflammation",
+    "biopsy": "Removal of a small piece of tissue for examination",
+    "prognosis": "The likely outcome or course of a disease",
+    "remission": "A decrease in or disappearance of signs and symptoms of disease",
+    "metastasis": "Spread of cancer cells to new areas of the body",
+    "intravenous": "Delivered directly into a vein",
+    "subcutaneous": "Under the skin"
+}
+
+def load_glossary(path: str) -> dict:
+    """
+    Read a glossary file into {term: explanation}. Accepts a JSON object,
+    or CSV/TSV rows of `term,explanation` (a header row is skipped).
+    """
+    if path.lower().endswith(".json"):
+        with open(path, encoding="utf8") as f:
+            entries = json.load(f).items()
+    else:
+        delimiter = "\t" if path.lower().endswith((".tsv", ".tab")) else ","
+        with open(path, encoding="utf8", newline="") as f:
+            entries = [tuple(row[:2]) for row in csv.reader(f, delimiter=delimiter) if len(row) >= 2]
+        if entries and entries[0][0].strip().lower() == "term":
+            entries = entries[1:]
+
+    glossary = {}
+    for term, explanation in entries:
+        term = term.strip().lower()
+        if term:
+            glossary[term] = explanation.strip()
+    return glossary
 
 class MedicalJargonTranslator:
-    def __init__(self):
-        self.dictionary = {
-            "hypertension": "High blood pressure",
-            "acute": "Sudden, recent onset",
-            "chronic": "Long-lasting condition, continuing for a long time",
-            "benign": "Not harmful or cancerous",
-            "malignant": "Harmful, likely cancerous",
-            "edema": "Swelling caused by fluid trapped in your body's tissues",
-            "idiopathic": "Of unknown cause",
-            "myocardial infarction": "Heart attack",
-            "cerebrovascular accident": "Stroke",
-            "dyspnea": "Shortness of breath or difficulty breathing",
-            "bradycardia": "Slower than normal heart rate",
-            "tachycardia": "Faster than normal heart rate",
-            "analgesic": "Pain reliever",
-            "anti-inflammatory": "Reduces swelling and inflammation",
-            "biopsy": "Removal of a small piece of tissue for examination",
-            "prognosis": "The likely outcome or course of a disease",
-            "remission": "A decrease in or disappearance of signs and symptoms of disease",
-            "metastasis": "Spread of cancer cells to new areas of the body",
-            "intravenous": "Delivered directly into a vein",
-            "subcutaneous": "Under the skin"
-        }
+    # Automaton for the built-in glossary, compiled once and shared by every instance
+    _default_matcher = None
+
+    def __init__(self, glossary_path: str = None):
+        self.dictionary = DEFAULT_GLOSSARY
+        if glossary_path:
+            self.dictionary = dict(DEFAULT_GLOSSARY)
+            self.dictionary.update(load_glossary(glossary_path))
+            self.matcher = PhraseMatcher({"glossary": self.dictionary})
+        else:
+            if MedicalJargonTranslator._default_matcher is None:
+                MedicalJargonTranslator._default_matcher = PhraseMatcher({"glossary": DEFAULT_GLOSSARY})
+            self.matcher = MedicalJargonTranslator._default_matcher
 
-    @lru_cache(maxsize=256)
     def translate(self, text: str) -> dict:
         """
         Identify medical terms in text and provide simpler explanations.
+        All glossary terms are found in a single scan of the text.
         """
-        simplified_text = text
-        terms_found = []
-        
-        # Simple case-insensitive replacement/matching
-        for term, explanation in self.dictionary.items():
-            pattern = re.compile(re.escape(term), re.IGNORECASE)
-            if pattern.search(text):
-                terms_found.append({
-                    "term": term,
-                    "explanation": explanation
-                })
-                # Create simplistic "Explain like I'm 5" version inline?
-                # For now just identifying terms.
+        # Case-insensitive matching; terms come back in glossary order
+        found = self.matcher.hits_by_table(text).get("glossary", [])
+        terms_found = [
+            {
+                "term": term,
+                "explanation": self.dictionary[term]
+            }
+            for term in found
+        ]
                 
         return {
             "original_text": text,
@@ -0,0 +1,250 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+LLM_REQUESTS = REGISTRY.counter(
+    "medsy_llm_requests_total", "Upstream LLM calls by outcome.", ["outcome"])
+
+# Upstream answers worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class BackendUnavailable(Exception):
+    """The backend could not produce a completion; callers should fall back."""
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `reset_timeout` seconds; then lets a single trial call through
+    (half-open) and closes again if it succeeds.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            return True
+        # Open, or half-open with the trial call already in flight
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def release_trial(self):
+        """The half-open trial ended without a verdict (cancelled, never sent): allow another."""
+        if self.state == self.HALF_OPEN:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic() - self.reset_timeout
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+class LLMBackend:
+    """Async completion backend used by AIGenerator."""
+
+    async def complete(self, system_prompt: str, user_prompt: str) -> str:
+        raise NotImplementedError
+
+    async def stream(self, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        """Yield the completion in pieces; backends that can't stream yield it whole."""
+        yield await self.complete(system_prompt, user_prompt)
+
+    async def aclose(self):
+        pass
+
+class OpenAIChatBackend(LLMBackend):
+    """
+    OpenAI-compatible /v1/chat/completions client.
+
+    One pooled AsyncClient is shared by all requests. At most
+    `max_concurrency` calls are in flight; a call that can't get a slot
+    within `timeout` is rejected rather than queued indefinitely. Timeouts,
+    connection errors and retryable statuses are retried `max_retries`
+    times with full-jitter exponential backoff, and repeated failures open
+    the circuit breaker so a struggling upstream fails fast.
+    """
+
+    def __init__(self, base_url: str, api_key: Optional[str] = None, model: str = "gpt-4o",
+                 timeout: float = 10.0, connect_timeout: float = 2.0, max_retries: int = 2,
+                 backoff_base: float = 0.2, max_concurrency: int = 32, max_connections: int = 64,
+                 breaker: Optional[CircuitBreaker] = None, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.breaker = breaker or CircuitBreaker()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport,
+        )
+
+    @asynccontextmanager
+    async def _guarded(self):
+        """
+        Admission (breaker, concurrency slot) and outcome reporting for one
+        call. Every exit reports back to the breaker, or a half-open trial
+        would keep it rejecting calls forever.
+        """
+        if not self.breaker.allow():
+            LLM_REQUESTS.inc(outcome="circuit_open")
+            raise BackendUnavailable("circuit open")
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.breaker.release_trial()
+            LLM_REQUESTS.inc(outcome="saturated")
+            raise BackendUnavailable("too many concurrent LLM calls")
+        except BaseException:
+            self.breaker.release_trial()
+            raise
+        try:
+            yield
+        except BackendUnavailable:
+            self.breaker.record_failure()
+            raise
+        except Exception as e:
+            self.breaker.record_failure()
+            LLM_REQUESTS.inc(outcome="error")
+            raise BackendUnavailable(f"LLM call failed: {e}") from e
+        except BaseException:
+            # Cancelled, or a stream the caller stopped reading
+            self.breaker.release_trial()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            self._semaphore.release()
+
+    def _payload(self, system_prompt, user_prompt, stream=False):
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            "stream": stream,
+        }
+
+    async def complete(self, system_prompt, user_prompt):
+        async with self._guarded():
+            return await self._complete_with_retries(system_prompt, user_prompt)
+
+    async def stream(self, system_prompt, user_prompt):
+        """
+        Yield content deltas from a streamed (SSE) completion as they arrive.
+        Failures before the first delta are retried like complete(); once
+        text has been yielded a failure ends the stream with BackendUnavailable.
+        """
+        async with self._guarded():
+            payload = self._payload(system_prompt, user_prompt, stream=True)
+            started = False
+            error = None
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    await asyncio.sleep(random.uniform(0, self.backoff_base * 2 ** attempt))
+                try:
+                    async with self._client.stream("POST", "/v1/chat/completions", json=payload) as response:
+                        if response.status_code in RETRY_STATUSES:
+                            error = BackendUnavailable(f"upstream status {response.status_code}")
+                            LLM_REQUESTS.inc(outcome="retryable_status")
+                            continue
+                        if response.status_code >= 400:
+                            LLM_REQUESTS.inc(outcome="bad_response")
+                            raise BackendUnavailable(f"upstream status {response.status_code}")
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[5:].strip()
+                            if data == "[DONE]":
+                                break
+                            delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                            if delta:
+                                started = True
+                                yield delta
+                    LLM_REQUESTS.inc(outcome="ok")
+                    return
+                except httpx.TransportError as e:  # includes timeouts
+                    LLM_REQUESTS.inc(outcome="transport_error")
+                    if started:
+                        raise BackendUnavailable(f"stream interrupted: {e}") from e
+                    error = e
+            logger.warning("LLM stream failed after %d attempts: %s", self.max_retries + 1, error)
+            raise BackendUnavailable(str(error)) from error
+
+    async def _complete_with_retries(self, system_prompt, user_prompt):
+        payload = self._payload(system_prompt, user_prompt)
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(random.uniform(0, self.backoff_base * 2 ** attempt))
+            try:
+                response = await self._client.post("/v1/chat/completions", json=payload)
+            except httpx.TransportError as e:  # includes timeouts
+                error = e
+                LLM_REQUESTS.inc(outcome="transport_error")
+                continue
+            if response.status_code in RETRY_STATUSES:
+                error = BackendUnavailable(f"upstream status {response.status_code}")
+                LLM_REQUESTS.inc(outcome="retryable_status")
+                continue
+            try:
+                response.raise_for_status()
+                text = response.json()["choices"][0]["message"]["content"]
+            except (httpx.HTTPStatusError, KeyError, IndexError, TypeError, ValueError) as e:
+                LLM_REQUESTS.inc(outcome="bad_response")
+                raise BackendUnavailable(f"unusable upstream response: {e}") from e
+            LLM_REQUESTS.inc(outcome="ok")
+            return text
+        logger.warning("LLM call failed after %d attempts: %s", self.max_retries + 1, error)
+        raise BackendUnavailable(str(error)) from error
+
+    async def aclose(self):
+        await self._client.aclose()
+
+def create_llm_backend() -> Optional[LLMBackend]:
+    """Backend selected by LLM_BACKEND; None means keyword replies only."""
+    if settings.LLM_BACKEND == "mock":
+        return None
+    if settings.LLM_BACKEND == "openai":
+        return OpenAIChatBackend(
+            settings.LLM_BASE_URL,
+            api_key=settings.LLM_API_KEY or os.getenv("OPENAI_API_KEY"),
+            model=settings.LLM_MODEL,
+            timeout=settings.LLM_TIMEOUT_SECONDS,
+            connect_timeout=settings.LLM_CONNECT_TIMEOUT_SECONDS,
+            max_retries=settings.LLM_MAX_RETRIES,
+            max_concurrency=settings.LLM_MAX_CONCURRENCY,
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            breaker=CircuitBreaker(settings.LLM_BREAKER_THRESHOLD, settings.LLM_BREAKER_RESET_SECONDS),
+        )
+    raise ValueError(f"Unknown LLM_BACKEND '{settings.LLM_BACKEND}'")
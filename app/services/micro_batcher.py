@@ -0,0 +1,77 @@
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional, Sequence
+
+
+class MicroBatcher:
+    """
+    Collect concurrent single-item requests for a few milliseconds and
+    score them together with one call to `batch_fn`.
+
+    `batch_fn` takes a list of items and returns a list of results in the
+    same order. A batch is flushed as soon as it reaches `max_batch_size`
+    or when `max_wait_ms` has elapsed since its first item arrived.
+    `runner(batch_fn, items)` executes the call off the event loop, e.g.
+    `run_in_thread`; without it the batch runs inline.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 2.0,
+        runner: Optional[Callable[..., Awaitable[Sequence[Any]]]] = None
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.runner = runner
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        task = asyncio.ensure_future(self._run(batch))
+        # Keep a reference so the task is not garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            if self.runner is not None:
+                results = await self.runner(self.batch_fn, items)
+            else:
+                results = self.batch_fn(items)
+            results = list(results)
+            if len(results) != len(batch):
+                # zip() would leave the extra callers waiting forever
+                raise ValueError(f"batch_fn returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -1,14 +1,19 @@
 import re
+from functools import lru_cache
 import nltk
 from nltk.stem import PorterStemmer, WordNetLemmatizer
 from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
-from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+from app.services.phrase_matcher import PhraseMatcher
+from app.services.symptom_index import SymptomIndex
 
 class MedicalNLPProcessor:
-    def __init__(self):
+    def __init__(self, symptom_phrases=None):
+        """
+        `symptom_phrases` (e.g. a full ontology, see SymptomIndex.from_file)
+        replaces the built-in list for similarity lookups only.
+        """
         # Ensure NLTK data is downloaded
         self._download_nltk_resources()
         
@@ -35,9 +40,11 @@ class MedicalNLPProcessor:
             "symptom_check": ["check", "symptom", "diagnosis", "feel", "pain"],
         }
 
-        # Initialize Vectorizer for Similarity
-        self.vectorizer = TfidfVectorizer()
-        self._fit_vectorizers()
+        # One automaton over symptoms, urgency flags and intent keywords
+        self.matcher = PhraseMatcher(self.keyword_tables())
+
+        # TF-IDF index for similarity
+        self.symptom_index = SymptomIndex(symptom_phrases or self.common_symptoms)
 
     def _download_nltk_resources(self):
         """Download necessary NLTK data if not present."""
@@ -51,9 +58,14 @@ class MedicalNLPProcessor:
                 except LookupError:
                     nltk.download(res, quiet=True)
 
-    def _fit_vectorizers(self):
-        """Fit TF-IDF vectorizer on the known symptoms list."""
-        self.tfidf_matrix = self.vectorizer.fit_transform(self.common_symptoms)
+    def keyword_tables(self) -> dict:
+        tables = {
+            "common_symptoms": self.common_symptoms,
+            "urgency_keywords": self.urgency_keywords,
+        }
+        for intent, keywords in self.intent_keywords.items():
+            tables[f"intent:{intent}"] = keywords
+        return tables
 
     # --- 1. REGEX PATTERNS ---
     def extract_entities(self, text: str) -> dict:
@@ -111,25 +123,36 @@ class MedicalNLPProcessor:
         }
 
     # --- 3. KEYWORD DETECTION ---
+    @lru_cache(maxsize=128)
+    def _keyword_hits(self, text: str) -> dict:
+        """
+        One scan of `text` for every keyword table. Cached, so the three
+        checks below share a single scan of each message.
+        """
+        return self.matcher.hits_by_table(text)
+
+    def analyze(self, text: str) -> dict:
+        """Intent, urgency and known symptoms of `text` together."""
+        return {
+            "intent": self.detect_intent(text),
+            "urgency": self.assess_urgency(text),
+            "symptoms": self.extract_known_symptoms(text),
+        }
+
     def detect_intent(self, text: str) -> str:
         """Determine user intent based on keywords."""
-        text_lower = text.lower()
+        hits = self._keyword_hits(text)
         
-        # Check against intent dictionary
-        for intent, keywords in self.intent_keywords.items():
-            for kw in keywords:
-                if kw in text_lower:
-                    return intent
+        # First intent (in dictionary order) with any keyword present
+        for intent in self.intent_keywords:
+            if f"intent:{intent}" in hits:
+                return intent
         return "general_chat"
 
     def assess_urgency(self, text: str) -> dict:
         """Check for urgency keywords."""
-        text_lower = text.lower()
-        detected_urgency = []
-        
-        for kw in self.urgency_keywords:
-            if kw in text_lower:
-                detected_urgency.append(kw)
+        # Copied: the cached hits are shared between callers
+        detected_urgency = list(self._keyword_hits(text).get("urgency_keywords", []))
         
         is_urgent = len(detected_urgency) > 0
         return {
@@ -140,33 +163,27 @@ class MedicalNLPProcessor:
     
     def extract_known_symptoms(self, text: str) -> list:
         """Exact keyword matching for known symptoms list."""
-        found = []
-        text_lower = text.lower()
-        for symptom in self.common_symptoms:
-            if symptom in text_lower:
-                found.append(symptom)
-        return found
+        return list(self._keyword_hits(text).get("common_symptoms", []))
 
     # --- 4. BAG-OF-WORDS & TF-IDF ---
+    SIMILARITY_THRESHOLD = 0.2
+
     def find_similar_symptom(self, query: str) -> dict:
         """Find the most similar known symptom using TF-IDF."""
-        # Transform query
-        query_vec = self.vectorizer.transform([query])
-        
-        # Calculate cosine similarity with all known symptoms
-        similarities = cosine_similarity(query_vec, self.tfidf_matrix).flatten()
-        
-        # Get best match
-        best_idx = np.argmax(similarities)
-        best_score = similarities[best_idx]
-        
-        if best_score > 0.2: # Threshold
-            return {
-                "match": self.common_symptoms[best_idx],
-                "score": float(best_score)
-            }
+        matches = self.symptom_index.query(query, k=1)
+        if matches and matches[0].score > self.SIMILARITY_THRESHOLD:
+            return {"match": matches[0].phrase, "score": matches[0].score}
         return {"match": None, "score": 0.0}
 
+    def find_similar_symptoms(self, query: str, k: int = 5) -> list:
+        """Top `k` similar symptoms as {"match", "score"} dicts, best first."""
+        return self.find_similar_symptoms_batch([query], k)[0]
+
+    def find_similar_symptoms_batch(self, queries: list, k: int = 5) -> list:
+        """find_similar_symptoms for many queries in one vectorized pass."""
+        results = self.symptom_index.query_batch(queries, k=k, min_score=self.SIMILARITY_THRESHOLD)
+        return [[{"match": m.phrase, "score": m.score} for m in matches] for matches in results]
+
 if __name__ == "__main__":
     # Simple manual test when running module directly
     nlp = MedicalNLPProcessor()
@@ -174,7 +191,8 @@ if __name__ == "__main__":
     test_text = "I have a severe headache and high fever. Can I book an appointment for 12/05/2024?"
     print(f"Text: {test_text}")
     print(f"Entities: {nlp.extract_entities(test_text)}")
-    print(f"Intent: {nlp.detect_intent(test_text)}")
-    print(f"Urgency: {nlp.assess_urgency(test_text)}")
-    print(f"Symptoms (Keyword): {nlp.extract_known_symptoms(test_text)}")
+    analysis = nlp.analyze(test_text)
+    print(f"Intent: {analysis['intent']}")
+    print(f"Urgency: {analysis['urgency']}")
+    print(f"Symptoms (Keyword): {analysis['symptoms']}")
     print(f"Similarity ('head pain'): {nlp.find_similar_symptom('head pain')}")
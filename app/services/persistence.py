@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Appointment, User
+from app.services.appointment_flow import AppointmentBookingFlow
+
+# Start hour of each bookable slot
+SLOT_HOURS = {"morning": 9, "afternoon": 14, "evening": 18}
+
+def parse_slot(date_text: Optional[str], time_text: Optional[str], now: datetime = None) -> Optional[datetime]:
+    """
+    Best-effort datetime for the free-text date/time the booking flow
+    collects ("Tomorrow" + "Morning", "Oct 21" + "Evening"). Returns None
+    when the date can't be read; the raw text is kept in the description.
+    """
+    now = now or datetime.now()
+    text = (date_text or "").strip().lower()
+    if text == "today":
+        day = now
+    elif text == "tomorrow":
+        day = now + timedelta(days=1)
+    else:
+        try:
+            day = datetime.strptime(text.title(), "%b %d").replace(year=now.year)
+        except ValueError:
+            return None
+        if day.date() < now.date():
+            day = day.replace(year=now.year + 1)
+    hour = SLOT_HOURS.get((time_text or "").strip().lower(), 9)
+    return day.replace(hour=hour, minute=0, second=0, microsecond=0)
+
+async def ensure_users(db: AsyncSession, user_ids: Iterable[int]):
+    """
+    Create bare `users` rows for ids not seen before. Clients identify
+    themselves by user_id alone and nothing registers users yet, but every
+    table references users.user_id. Call before adding other rows: a race
+    with another writer rolls the session back.
+    """
+    ids = set(user_ids)
+    existing = set((await db.execute(select(User.user_id).where(User.user_id.in_(ids)))).scalars())
+    missing = sorted(ids - existing)
+    if not missing:
+        return
+    try:
+        await db.execute(insert(User), [{"user_id": user_id} for user_id in missing])
+        await db.flush()
+    except IntegrityError:
+        # Created concurrently by another request or worker
+        await db.rollback()
+
+async def save_appointment(db: AsyncSession, user_id: int, flow: AppointmentBookingFlow) -> Appointment:
+    """Persist a confirmed booking from a COMPLETED flow."""
+    await ensure_users(db, [user_id])
+    appointment = Appointment(
+        user_id=user_id,
+        date=parse_slot(flow.date, flow.time),
+        status="Scheduled",
+        problem_category=flow.problem,
+        description=f"{flow.booking_id}: {flow.problem} on {flow.date} ({flow.time})",
+        doctor_name=flow.DOCTOR,
+        location=flow.LOCATION,
+    )
+    db.add(appointment)
+    await db.commit()
+    return appointment
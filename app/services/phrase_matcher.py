@@ -0,0 +1,127 @@
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+
+class PhraseMatch(NamedTuple):
+    start: int
+    end: int
+    phrase: str
+    table: str
+
+
+class PhraseMatcher:
+    """
+    Aho-Corasick automaton over one or more named keyword tables.
+
+    All phrases are compiled once; `scan` then walks the lowercased text a
+    single time and reports every occurrence of every phrase, regardless of
+    how many tables or terms were registered. Matching is plain substring
+    matching, the same as the `phrase in text` checks it replaces.
+    """
+
+    # Transitions live in one flat dict keyed by (node << 21) | ord(char)
+    # rather than a dict per node, which keeps vocabularies of tens of
+    # thousands of phrases compact. 21 bits covers every Unicode code point.
+    _CHAR_BITS = 21
+
+    def __init__(self, tables: Optional[Dict[str, Iterable[str]]] = None):
+        self._goto: Dict[int, int] = {}
+        self._fail: List[int] = [0]
+        self._out: Dict[int, tuple] = {}  # only nodes that emit something
+        self._size = 1  # node 0 is the root
+        self._built = False
+        self.tables: Dict[str, List[str]] = {}
+        self._rank: Dict[tuple, int] = {}
+
+        if tables:
+            for table, phrases in tables.items():
+                self.add_table(table, phrases)
+            self.build()
+
+    def add_table(self, table: str, phrases: Iterable[str]):
+        for phrase in phrases:
+            self.add(phrase, table)
+
+    def add(self, phrase: str, table: str):
+        """Register a phrase under a table name. Call `build()` afterwards."""
+        phrase = phrase.lower()
+        if not phrase:
+            return
+        phrases = self.tables.setdefault(table, [])
+        self._rank.setdefault((table, phrase), len(phrases))
+        phrases.append(phrase)
+
+        node = 0
+        for char in phrase:
+            key = (node << self._CHAR_BITS) | ord(char)
+            nxt = self._goto.get(key)
+            if nxt is None:
+                nxt = self._size
+                self._size += 1
+                self._goto[key] = nxt
+            node = nxt
+        outputs = self._out.get(node, ())
+        if (phrase, table) not in outputs:
+            self._out[node] = outputs + ((phrase, table),)
+        self._built = False
+
+    def build(self):
+        """Compute failure links (breadth-first) and merge output sets."""
+        bits, mask = self._CHAR_BITS, (1 << self._CHAR_BITS) - 1
+        goto, out = self._goto, self._out
+        fail = self._fail = [0] * self._size
+
+        children: List[List[tuple]] = [[] for _ in range(self._size)]
+        for key, child in goto.items():
+            children[key >> bits].append((key & mask, child))
+
+        queue = deque(child for _, child in children[0])
+        while queue:
+            node = queue.popleft()
+            for code, child in children[node]:
+                queue.append(child)
+                fallback = fail[node]
+                while fallback and (fallback << bits) | code not in goto:
+                    fallback = fail[fallback]
+                target = goto.get((fallback << bits) | code, 0)
+                fail[child] = target if target != child else 0
+                # Suffix outputs are copied down so scanning never chases links
+                inherited = out.get(fail[child])
+                if inherited:
+                    own = out.get(child, ())
+                    out[child] = own + tuple(o for o in inherited if o not in own)
+        self._built = True
+
+    def scan(self, text: str) -> List[PhraseMatch]:
+        """
+        Return every phrase occurrence in `text` with offsets (into the
+        lowercased text) and the table that owns the phrase.
+        """
+        if not self._built:
+            self.build()
+
+        goto, fail, out, bits = self._goto, self._fail, self._out, self._CHAR_BITS
+        matches = []
+        node = 0
+        for i, char in enumerate(text.lower()):
+            code = ord(char)
+            while node and (node << bits) | code not in goto:
+                node = fail[node]
+            node = goto.get((node << bits) | code, 0)
+            if node in out:
+                for phrase, table in out[node]:
+                    matches.append(PhraseMatch(i + 1 - len(phrase), i + 1, phrase, table))
+        return matches
+
+    def hits_by_table(self, text: str) -> Dict[str, List[str]]:
+        """
+        Group distinct matched phrases by table. Phrases within a table are
+        listed in the order they were registered, not the order they occur.
+        """
+        grouped: Dict[str, set] = {}
+        for match in self.scan(text):
+            grouped.setdefault(match.table, set()).add(match.phrase)
+        return {
+            table: sorted(phrases, key=lambda p, t=table: self._rank[(t, p)])
+            for table, phrases in grouped.items()
+        }
@@ -0,0 +1,166 @@
+import json
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.metrics import REGISTRY
+from app.services.phrase_matcher import PhraseMatcher
+
+RULE_HITS = REGISTRY.counter(
+    "medsy_reply_rule_hits_total", "Canned replies served, by rule.", ["rule"])
+
+# Canned replies used when no LLM is configured (or it is unavailable).
+# A rule fires when any of its `keywords` occurs in the message (substring
+# match) and every phrase in `requires` does too; among the rules that
+# fire, the highest `priority` wins, then the one listed first.
+DEFAULT_RULES = [
+    {
+        "name": "greeting",
+        "priority": 100,
+        "keywords": ["hello", "hi", "hey", "greetings"],
+        "response": "Hello! I'm Medsy, your medical companion. How can I help you today? I can help with symptom checking, booking appointments, or medication info.",
+    },
+    {
+        "name": "capabilities",
+        "priority": 90,
+        "keywords": ["who are you", "what can you do", "help", "guide"],
+        "response": ("I am Medsy, an AI-powered health assistant. You can ask me about:\n"
+                     "• Common symptoms (cough, fever, etc.)\n"
+                     "• Booking medical appointments\n"
+                     "• Understanding your medications\n"
+                     "• Emergency detection"),
+    },
+    {
+        "name": "cold",
+        "priority": 80,
+        "keywords": ["cold", "cough", "flu", "sneeze"],
+        "response": ("It sounds like you might be dealing with a viral infection. Common symptoms include coughing, congestion, and a sore throat. "
+                     "Most viral colds resolve on their own with rest and fluids. Would you like to book a checkup to be sure?"),
+    },
+    {
+        "name": "fever",
+        "priority": 70,
+        "keywords": ["fever", "temp", "hot", "shiver"],
+        "response": ("A fever is usually a sign of your immune system fighting an infection. For adults, a high fever is generally above 103°F (39.4°C). "
+                     "Make sure to stay hydrated. If the fever persists for more than 3 days, please schedule a visit."),
+    },
+    {
+        "name": "chest_pain",
+        "priority": 61,
+        "keywords": ["pain", "hurt", "ache"],
+        "requires": ["chest"],
+        "response": "URGENT: Since you mentioned chest pain, please sit down and rest. If it's severe or radiating, call emergency services immediately.",
+    },
+    {
+        "name": "pain",
+        "priority": 60,
+        "keywords": ["pain", "hurt", "ache"],
+        "response": "I'm sorry you're in pain. For minor aches, rest and over-the-counter relief can help, but recurring pain should be examined by a professional.",
+    },
+    {
+        "name": "medication",
+        "priority": 50,
+        "keywords": ["medicine", "pill", "drug", "tablet", "dosage"],
+        "response": ("Medication should always be taken exactly as prescribed by your doctor. "
+                     "Would you like me to look up information on a specific drug like Paracetamol or Ibuprofen?"),
+    },
+    {
+        "name": "appointment",
+        "priority": 40,
+        "keywords": ["appointment", "book", "see a doctor", "visit"],
+        "response": "I can certainly help you with that! Just say 'I want to book an appointment' and I'll start the scheduling process for you.",
+    },
+]
+
+DEFAULT_FALLBACK = ("I'm not exactly sure how to help with that yet. You can try asking:\n"
+                    "• 'What are cold symptoms?'\n"
+                    "• 'I want to book an appointment'\n"
+                    "• 'I have a fever'\n"
+                    "• 'Tell me about medications'")
+
+def load_rules(path: str) -> dict:
+    """
+    Read a rule file: JSON, or YAML (needs PyYAML). The document is either
+    a list of rules or {"rules": [...], "fallback": "..."}.
+    """
+    with open(path, encoding="utf8") as f:
+        if path.lower().endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError as e:
+                raise ImportError("PyYAML is required to load YAML reply rules (pip install pyyaml)") from e
+            document = yaml.safe_load(f)
+        else:
+            document = json.load(f)
+    if isinstance(document, list):
+        document = {"rules": document}
+    return document
+
+class ResponseRuleEngine:
+    """
+    Canned replies compiled into one PhraseMatcher: every keyword of every
+    rule is found in a single scan of the message, so the cost of a reply
+    doesn't grow with the number of rules. Counts how often each rule fired
+    (`hits`, and medsy_reply_rule_hits_total) for tuning the table.
+    """
+
+    FALLBACK = "fallback"
+
+    def __init__(self, rules: Optional[Iterable[dict]] = None, fallback: str = DEFAULT_FALLBACK):
+        self.rules: List[dict] = []
+        self.fallback = fallback
+        self.hits: Counter = Counter()
+        self._lock = threading.Lock()
+        self.matcher = PhraseMatcher()
+
+        for order, rule in enumerate(DEFAULT_RULES if rules is None else rules):
+            if not rule.get("keywords") or "response" not in rule:
+                raise ValueError(f"Reply rule #{order} needs 'keywords' and 'response'")
+            name = rule.get("name") or f"rule_{order}"
+            self.rules.append({
+                "name": name,
+                "response": rule["response"],
+                # Sort key: higher priority first, then file order
+                "rank": (-rule.get("priority", 0), order),
+                "requires": tuple(p.lower() for p in rule.get("requires", ())),
+            })
+            self.matcher.add_table(f"rule:{order}", rule["keywords"])
+        self._requires = sorted({p for rule in self.rules for p in rule["requires"]})
+        self.matcher.add_table("requires", self._requires)
+        self.matcher.build()
+
+    @classmethod
+    def from_file(cls, path: str) -> "ResponseRuleEngine":
+        document = load_rules(path)
+        return cls(document.get("rules", []), document.get("fallback", DEFAULT_FALLBACK))
+
+    def match(self, text: str) -> Optional[dict]:
+        """The winning rule for `text`, or None."""
+        found: Dict[str, List[str]] = self.matcher.hits_by_table(text)
+        present = set(found.pop("requires", ()))
+        best = None
+        for table in found:
+            rule = self.rules[int(table[5:])]
+            if all(p in present for p in rule["requires"]) and (best is None or rule["rank"] < best["rank"]):
+                best = rule
+        return best
+
+    def respond(self, text: str) -> str:
+        return self.reply(text)[1]
+
+    def reply(self, text: str) -> Tuple[str, str]:
+        """(rule name, reply) for `text`; the rule's hit is counted."""
+        rule = self.match(text)
+        name = rule["name"] if rule else self.FALLBACK
+        self.record(name)
+        return name, rule["response"] if rule else self.fallback
+
+    def record(self, name: str):
+        """Count a hit for `name`, e.g. when its reply is served from a cache."""
+        with self._lock:
+            self.hits[name] += 1
+        RULE_HITS.inc(rule=name)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.hits)
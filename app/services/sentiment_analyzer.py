@@ -2,6 +2,7 @@ import nltk
 from nltk.sentiment.vader import SentimentIntensityAnalyzer
 import re
 from functools import lru_cache
+from app.services.phrase_matcher import PhraseMatcher
 
 # Download VADER lexicon if not already present
 try:
@@ -16,6 +17,7 @@ class SentimentAnalyzer:
             "emergency", "severe", "can't breathe", "dying", "help", 
             "unbearable", "crushing", "stroke", "heart attack", "bleeding"
         ]
+        self.matcher = PhraseMatcher({"panic_keywords": self.panic_keywords})
 
     @lru_cache(maxsize=128)
     def analyze(self, text: str) -> dict:
@@ -49,8 +51,7 @@ class SentimentAnalyzer:
         """
         Detect urgency and panic in patient descriptions.
         """
-        text_lower = text.lower()
-        if any(keyword in text_lower for keyword in self.panic_keywords):
+        if self.matcher.scan(text):
             return True
         if anxiety_score > 8.0:
             return True
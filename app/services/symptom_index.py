@@ -0,0 +1,81 @@
+from typing import Iterable, List, NamedTuple, Sequence
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+
+class SymptomMatch(NamedTuple):
+    phrase: str
+    score: float
+
+
+class SymptomIndex:
+    """
+    TF-IDF similarity search over symptom/condition phrases.
+
+    Each phrase is described by word 1-2 grams and character 3-5 grams
+    (within word boundaries, so "haedache" still lands near "headache").
+    The two blocks are weighted, stacked and L2-normalised once at build
+    time, which makes cosine similarity a single sparse product per batch
+    of queries. Only phrases sharing a feature with the query get a score,
+    and the top k of those are picked with argpartition, so neither the
+    index nor a query ever materialises a dense queries x phrases matrix.
+    """
+
+    def __init__(self, phrases: Iterable[str], word_weight: float = 0.5, batch_size: int = 256):
+        # Duplicates would only split the top k between identical entries
+        self.phrases: List[str] = list(dict.fromkeys(p.strip().lower() for p in phrases if p.strip()))
+        if not self.phrases:
+            raise ValueError("SymptomIndex needs at least one phrase")
+        self.batch_size = batch_size
+        self._weights = (np.sqrt(word_weight), np.sqrt(1.0 - word_weight))
+        self._word = TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, dtype=np.float32)
+        self._char = TfidfVectorizer(analyzer="char_wb", ngram_range=(3, 5), sublinear_tf=True, dtype=np.float32)
+        self._word.fit(self.phrases)
+        self._char.fit(self.phrases)
+        # Stored transposed (features x phrases) for the query product
+        self._matrix_t = self._vectorize(self.phrases).T.tocsr()
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "SymptomIndex":
+        """One phrase per line; blank lines and '#' comments are skipped."""
+        with open(path, encoding="utf8") as f:
+            return cls((line for line in f if not line.lstrip().startswith("#")), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.phrases)
+
+    def _vectorize(self, texts: Sequence[str]) -> sp.csr_matrix:
+        word_w, char_w = self._weights
+        features = sp.hstack([
+            self._word.transform(texts) * word_w,
+            self._char.transform(texts) * char_w,
+        ], format="csr")
+        return normalize(features, copy=False)
+
+    def query(self, text: str, k: int = 5, min_score: float = 0.0) -> List[SymptomMatch]:
+        return self.query_batch([text], k, min_score)[0]
+
+    def query_batch(self, texts: Sequence[str], k: int = 5, min_score: float = 0.0) -> List[List[SymptomMatch]]:
+        """Best `k` phrases (score descending) for each text, above `min_score`."""
+        texts = [t.lower() for t in texts]
+        results = []
+        for offset in range(0, len(texts), self.batch_size):
+            scores = self._vectorize(texts[offset:offset + self.batch_size]) @ self._matrix_t
+            for row in range(scores.shape[0]):
+                results.append(self._top_k(scores, row, k, min_score))
+        return results
+
+    def _top_k(self, scores: sp.csr_matrix, row: int, k: int, min_score: float) -> List[SymptomMatch]:
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        values, columns = scores.data[start:end], scores.indices[start:end]
+        if min_score > 0:
+            keep = values >= min_score
+            values, columns = values[keep], columns[keep]
+        if len(values) > k:
+            best = np.argpartition(-values, k - 1)[:k]
+            values, columns = values[best], columns[best]
+        order = np.argsort(-values, kind="stable")
+        return [SymptomMatch(self.phrases[columns[i]], float(values[i])) for i in order]
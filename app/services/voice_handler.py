@@ -3,6 +3,10 @@ import pyttsx3
 import threading
 import time
 
+from app.services.voice_service import (
+    KeywordSpotter, SpeechRecognitionEngine, SphinxKeywordMatcher, TranscriptKeywordMatcher
+)
+
 class VoiceHandler:
     def __init__(self, wake_word="medsy"):
         self.wake_word = wake_word.lower()
@@ -39,8 +43,37 @@ class VoiceHandler:
                 print("API unavailable")
                 return None
 
-    def start_wake_word_detection(self, callback):
-        """Continuous listening for wake word (Simulated for non-blocking)."""
+    SPOT_SAMPLE_RATE = 16000
+
+    def _wake_matcher(self):
+        # pocketsphinx keyword search runs locally; otherwise only the short
+        # bursts that pass the energy gate are sent to the recognizer
+        try:
+            return SphinxKeywordMatcher(self.wake_word)
+        except ImportError:
+            return TranscriptKeywordMatcher(self.wake_word, SpeechRecognitionEngine("google"))
+
+    def _spot_wake_word(self, spotter, calibrate=False):
+        """Block until the wake word is heard (or listening stops); True on a hit."""
+        with sr.Microphone(sample_rate=self.SPOT_SAMPLE_RATE) as source:
+            if calibrate:
+                # About a second of ambient noise sets the energy gate
+                spotter.calibrate(source.stream.read(source.CHUNK)
+                                  for _ in range(self.SPOT_SAMPLE_RATE // source.CHUNK))
+            while self.is_listening:
+                # Blocking read: the thread sleeps until audio arrives
+                if spotter.feed(source.stream.read(source.CHUNK)):
+                    return True
+        return False
+
+    def start_wake_word_detection(self, callback, mode="spotting"):
+        """
+        Call `callback` whenever the wake word is heard.
+
+        "spotting" keeps the microphone open and gates on local audio energy;
+        only short voiced bursts reach the keyword matcher. "polling" is the
+        original loop that fully recognizes everything it hears.
+        """
         self.is_listening = True
         
         def _listen_loop():
@@ -51,7 +84,18 @@ class VoiceHandler:
                     callback()
                 time.sleep(0.5)
 
-        thread = threading.Thread(target=_listen_loop, daemon=True)
+        def _spot_loop():
+            spotter = KeywordSpotter(self._wake_matcher(), sample_rate=self.SPOT_SAMPLE_RATE)
+            calibrate = True
+            while self.is_listening:
+                if self._spot_wake_word(spotter, calibrate):
+                    print(f"Wake word '{self.wake_word}' detected!")
+                    # The microphone is released, so the callback may listen()
+                    callback()
+                calibrate = False
+
+        target = _spot_loop if mode == "spotting" else _listen_loop
+        thread = threading.Thread(target=target, daemon=True)
         thread.start()
 
     def stop_listening(self):
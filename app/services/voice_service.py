@@ -1,9 +1,520 @@
-class VoiceService:
+import asyncio
+import hashlib
+import io
+import shutil
+import tempfile
+import threading
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import BinaryIO, List, Optional
+
+import numpy as np
+
+from app.core.cache import DiskLRUCache
+from app.core.metrics import REGISTRY, timed
+
+TTS_CACHE_REQUESTS = REGISTRY.counter(
+    "medsy_tts_cache_requests_total", "Synthesized speech cache lookups.", ["result"])
+
+class VoiceBusy(Exception):
+    """Every transcription worker is busy and the wait queue is full."""
+
+class AudioTooLarge(Exception):
+    pass
+
+class STTEngine:
+    """Offline speech-to-text engine. `transcribe` blocks; it runs on the voice pool."""
+
+    name = "base"
+
+    def transcribe(self, audio: BinaryIO) -> str:
+        raise NotImplementedError
+
+    def transcribe_pcm(self, pcm: bytes, sample_rate: int) -> str:
+        """16-bit mono PCM; engines with a native streaming API can override this."""
+        return self.transcribe(io.BytesIO(pcm_to_wav(pcm, sample_rate)))
+
+def pcm_to_wav(pcm: bytes, sample_rate: int) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buf.getvalue()
+
+class StubSTTEngine(STTEngine):
+    """
+    Local stand-in used when no recognizer is installed: decodes the WAV
+    (so malformed uploads still fail) and reports its length.
+    """
+
+    name = "stub"
+
+    def transcribe(self, audio):
+        with wave.open(audio, "rb") as wav:
+            seconds = wav.getnframes() / float(wav.getframerate() or 1)
+        return f"[{seconds:.1f}s of audio]"
+
+class SpeechRecognitionEngine(STTEngine):
+    """
+    SpeechRecognition-backed engine. "sphinx" (pocketsphinx) works fully
+    offline; "google" uses the free web API.
+    """
+
+    def __init__(self, recognizer: str = "sphinx"):
+        import speech_recognition as sr
+        self._sr = sr
+        self.name = recognizer
+        self._method = getattr(sr.Recognizer, f"recognize_{recognizer}")
+        # Recognizer instances are not shared between threads
+        self._local = threading.local()
+
+    def transcribe(self, audio):
+        recognizer = getattr(self._local, "recognizer", None)
+        if recognizer is None:
+            recognizer = self._local.recognizer = self._sr.Recognizer()
+        with self._sr.AudioFile(audio) as source:
+            data = recognizer.record(source)
+        try:
+            return self._method(recognizer, data)
+        except self._sr.UnknownValueError:
+            return ""
+
+def create_stt_engine(name: str) -> STTEngine:
+    if name == "stub":
+        return StubSTTEngine()
+    return SpeechRecognitionEngine(name)
+
+class TTSEngine:
+    """Text-to-speech engine. `synthesize` blocks and writes a WAV file to `path`."""
+
+    name = "base"
+
+    def synthesize(self, text: str, voice: str, rate: int, path: str):
+        raise NotImplementedError
+
+class StubTTSEngine(TTSEngine):
+    """Local stand-in: silence as long as the text would take to read at `rate` words/min."""
+
+    name = "stub"
+
+    def synthesize(self, text, voice, rate, path, sample_rate=16000):
+        seconds = max(1, len(text.split())) * 60.0 / max(rate, 1)
+        with open(path, "wb") as f:
+            f.write(pcm_to_wav(b"\x00\x00" * int(sample_rate * seconds), sample_rate))
+
+class Pyttsx3TTSEngine(TTSEngine):
+    """
+    Offline synthesis through pyttsx3 (eSpeak/SAPI/NSSpeech). The driver is
+    not thread-safe, so calls are serialised on one lazily created engine.
+    """
+
+    name = "pyttsx3"
+
     def __init__(self):
-        pass
+        self._engine = None
+        self._default_voice = None
+        self._lock = threading.Lock()
+
+    def synthesize(self, text, voice, rate, path):
+        with self._lock:
+            if self._engine is None:
+                import pyttsx3
+                self._engine = pyttsx3.init()
+                self._default_voice = self._engine.getProperty("voice")
+            # The driver is shared: set every property on every call
+            self._engine.setProperty("voice", self._default_voice if voice == "default" else voice)
+            self._engine.setProperty("rate", rate)
+            self._engine.save_to_file(text, path)
+            self._engine.runAndWait()
+
+def create_tts_engine(name: str) -> TTSEngine:
+    if name == "stub":
+        return StubTTSEngine()
+    if name == "pyttsx3":
+        return Pyttsx3TTSEngine()
+    raise ValueError(f"Unknown TTS engine '{name}'")
+
+class VoiceService:
+    """
+    Server-side speech-to-text.
+
+    Transcriptions run on a dedicated pool of `workers` threads, separate
+    from the CPU pool the chat stages use, so a burst of voice uploads
+    can't stall chat. At most `max_queue` further jobs may wait; beyond
+    that `transcribe_upload` raises VoiceBusy instead of piling up work.
+    Uploads are copied in chunks, on the pool, into a spooled temp file (in
+    memory up to `spool_max_bytes`, then on disk) that is always removed
+    afterwards.
+
+    Synthesized speech shares the same pool and is cached on disk by
+    (engine, voice, rate, text); concurrent requests for the same audio
+    wait for a single synthesis.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, engine: Optional[STTEngine] = None, workers: int = 2, max_queue: int = 8,
+                 max_upload_bytes: int = 10 * 1024 * 1024, spool_max_bytes: int = 1024 * 1024,
+                 tts_engine: Optional[TTSEngine] = None, tts_cache: Optional[DiskLRUCache] = None,
+                 default_voice: str = "default", default_rate: int = 150):
+        self.engine = engine or StubSTTEngine()
+        self.tts_engine = tts_engine or StubTTSEngine()
+        self._tts_cache = tts_cache
+        self._own_tts_dir: Optional[str] = None
+        self.default_voice = default_voice
+        self.default_rate = default_rate
+        self._synthesizing = {}  # cache key -> Future of the audio path
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_upload_bytes = max_upload_bytes
+        self.spool_max_bytes = spool_max_bytes
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="medsy-voice")
+        return self._pool
+
+    def tts_key(self, text: str, voice: str, rate: int) -> str:
+        raw = "\0".join((self.tts_engine.name, voice, str(rate), text))
+        return hashlib.sha256(raw.encode("utf8")).hexdigest()
+
+    @property
+    def tts_cache(self) -> DiskLRUCache:
+        # Without a configured cache, audio goes to a private temp directory
+        # that shutdown() removes
+        if self._tts_cache is None:
+            self._own_tts_dir = tempfile.mkdtemp(prefix="medsy-tts-")
+            self._tts_cache = DiskLRUCache(self._own_tts_dir, suffix=".wav")
+        return self._tts_cache
+
+    def _tts_lookup(self, text, voice, rate):
+        """(cache key, cached path or None), counting the hit or miss once."""
+        key = self.tts_key(text, voice, rate)
+        cached = self.tts_cache.get(key)
+        TTS_CACHE_REQUESTS.inc(result="miss" if cached is None else "hit")
+        return key, cached
+
+    def _render(self, key, text, voice, rate) -> str:
+        with timed("text_to_speech"):
+            return self.tts_cache.put(key, lambda path: self.tts_engine.synthesize(text, voice, rate, path))
+
+    def text_to_speech(self, text: str, voice: Optional[str] = None, rate: Optional[int] = None) -> str:
+        """Blocking synthesis; returns the path of a WAV file in the TTS cache."""
+        voice = voice or self.default_voice
+        rate = rate or self.default_rate
+        key, cached = self._tts_lookup(text, voice, rate)
+        return cached if cached is not None else self._render(key, text, voice, rate)
+
+    async def synthesize(self, text: str, voice: Optional[str] = None, rate: Optional[int] = None) -> str:
+        """text_to_speech off the event loop. Cache hits never touch the pool."""
+        voice = voice or self.default_voice
+        rate = rate or self.default_rate
+        key, cached = self._tts_lookup(text, voice, rate)
+        if cached is not None:
+            return cached
+        pending = self._synthesizing.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._synthesizing[key] = future
+        try:
+            with self._slot():
+                path = await self._run(self._render, key, text, voice, rate)
+            future.set_result(path)
+            return path
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters get the error too; mark it retrieved in case there are none
+            future.exception()
+            raise
+        finally:
+            del self._synthesizing[key]
+
+    def speech_to_text(self, audio_data: BinaryIO) -> str:
+        """Blocking transcription of a file-like object holding WAV/AIFF/FLAC audio."""
+        with timed("speech_to_text"):
+            return self.engine.transcribe(audio_data)
+
+    @contextmanager
+    def _slot(self):
+        if not self._slots.acquire(blocking=False):
+            raise VoiceBusy()
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._get_pool(), fn, *args)
+
+    def _transcribe_file(self, source: BinaryIO) -> str:
+        """Copy `source` into a bounded spool and transcribe it; runs on the voice pool."""
+        with tempfile.SpooledTemporaryFile(max_size=self.spool_max_bytes) as spool:
+            size = 0
+            while chunk := source.read(self.CHUNK_SIZE):
+                size += len(chunk)
+                if size > self.max_upload_bytes:
+                    raise AudioTooLarge()
+                spool.write(chunk)
+            spool.seek(0)
+            return self.speech_to_text(spool)
+
+    async def transcribe_upload(self, upload) -> str:
+        """Transcribe a FastAPI UploadFile without blocking the event loop."""
+        try:
+            with self._slot():
+                # Reading, spooling and the size check all happen off the loop
+                return await self._run(self._transcribe_file, upload.file)
+        finally:
+            await upload.close()
+
+    def _pcm_to_text(self, pcm: bytes, sample_rate: int) -> str:
+        with timed("speech_to_text"):
+            return self.engine.transcribe_pcm(pcm, sample_rate)
+
+    SLOT_POLL_SECONDS = 0.02
+
+    async def transcribe_pcm(self, pcm: bytes, sample_rate: int, wait: bool = False) -> str:
+        """
+        Transcribe PCM on the voice pool. With `wait`, queue for a slot
+        instead of raising VoiceBusy (for audio that must not be lost).
+        """
+        if not wait:
+            with self._slot():
+                return await self._run(self._pcm_to_text, pcm, sample_rate)
+        while not self._slots.acquire(blocking=False):
+            await asyncio.sleep(self.SLOT_POLL_SECONDS)
+        try:
+            return await self._run(self._pcm_to_text, pcm, sample_rate)
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        if self._own_tts_dir is not None:
+            shutil.rmtree(self._own_tts_dir, ignore_errors=True)
+            self._own_tts_dir = self._tts_cache = None
+
+class EnergyVAD:
+    """
+    Voice activity detection on 16-bit mono PCM: a frame is speech when its
+    RMS energy reaches `threshold`.
+    """
+
+    def __init__(self, sample_rate: int = 16000, frame_ms: int = 30, threshold: float = 500.0):
+        self.frame_ms = frame_ms
+        self.threshold = threshold
+        self.frame_bytes = sample_rate * frame_ms // 1000 * 2
+
+    def is_speech(self, frame: bytes) -> bool:
+        samples = np.frombuffer(frame, dtype="<i2").astype(np.float32)
+        return bool(samples.size) and float(np.sqrt(np.mean(samples * samples))) >= self.threshold
+
+class StreamingTranscriber:
+    """
+    Turns a stream of PCM chunks into transcript events for one session.
+
+    Silence before speech is dropped. While the user speaks, the utterance
+    so far is re-transcribed every `partial_interval_ms` ("partial"); once
+    `hangover_ms` of silence follows speech, or the utterance reaches
+    `max_utterance_ms`, it is transcribed one last time ("final") and a new
+    utterance starts. Partials are skipped while the voice pool is busy;
+    finals wait for it, and the utterance is kept until one succeeds.
+    """
+
+    def __init__(self, service: VoiceService, sample_rate: int = 16000, vad: Optional[EnergyVAD] = None,
+                 hangover_ms: int = 600, partial_interval_ms: int = 1000, max_utterance_ms: int = 15000):
+        self.service = service
+        self.sample_rate = sample_rate
+        self.vad = vad or EnergyVAD(sample_rate)
+        self.hangover_ms = hangover_ms
+        self.partial_interval_ms = partial_interval_ms
+        self.max_utterance_ms = max_utterance_ms
+        self._pending = b""
+        self._utterance = bytearray()
+        self._speech = False
+        self._silence_ms = 0
+        self._since_partial_ms = 0
+
+    @property
+    def _utterance_ms(self) -> int:
+        return len(self._utterance) // self.vad.frame_bytes * self.vad.frame_ms
+
+    async def feed(self, chunk: bytes) -> List[dict]:
+        events = []
+        data = self._pending + chunk
+        size = self.vad.frame_bytes
+        usable = len(data) - len(data) % size
+        self._pending = data[usable:]
+        for start in range(0, usable, size):
+            frame = data[start:start + size]
+            if self.vad.is_speech(frame):
+                self._speech = True
+                self._silence_ms = 0
+            elif not self._speech:
+                continue
+            else:
+                self._silence_ms += self.vad.frame_ms
+            self._utterance += frame
+            self._since_partial_ms += self.vad.frame_ms
+            if self._silence_ms >= self.hangover_ms or self._utterance_ms >= self.max_utterance_ms:
+                events.append(await self._final())
+        if self._speech and self._since_partial_ms >= self.partial_interval_ms:
+            self._since_partial_ms = 0
+            try:
+                text = await self.service.transcribe_pcm(bytes(self._utterance), self.sample_rate)
+            except VoiceBusy:
+                pass
+            else:
+                events.append({"type": "partial", "text": text})
+        return events
+
+    async def finish(self) -> List[dict]:
+        """Flush the utterance in progress at the end of the stream."""
+        return [await self._final()] if self._speech else []
+
+    async def _final(self) -> dict:
+        # Trailing silence carries nothing for the recognizer
+        speech = bytes(self._utterance[:len(self._utterance) - self._silence_ms // self.vad.frame_ms * self.vad.frame_bytes])
+        text = await self.service.transcribe_pcm(speech, self.sample_rate, wait=True)
+        self._utterance.clear()
+        self._speech = False
+        self._silence_ms = self._since_partial_ms = 0
+        return {"type": "final", "text": text}
+
+class AudioRingBuffer:
+    """Fixed-size byte ring holding the most recent `capacity` bytes of audio."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buf = bytearray(capacity)
+        self._pos = 0
+        self._filled = 0
+
+    def write(self, data: bytes):
+        data = data[-self.capacity:]
+        end = self._pos + len(data)
+        if end <= self.capacity:
+            self._buf[self._pos:end] = data
+        else:
+            split = self.capacity - self._pos
+            self._buf[self._pos:] = data[:split]
+            self._buf[:end - self.capacity] = data[split:]
+        self._pos = end % self.capacity
+        self._filled = min(self.capacity, self._filled + len(data))
+
+    def last(self, n: int) -> bytes:
+        """The newest `n` bytes (fewer if not yet written), oldest first."""
+        n = min(n, self._filled)
+        start = (self._pos - n) % self.capacity
+        if start + n <= self.capacity:
+            return bytes(self._buf[start:start + n])
+        return bytes(self._buf[start:]) + bytes(self._buf[:self._pos])
+
+class SphinxKeywordMatcher:
+    """Offline keyword search with pocketsphinx; cheap enough to run on every voiced burst."""
+
+    def __init__(self, keyword: str, sensitivity: float = 0.8):
+        import speech_recognition as sr
+        import pocketsphinx  # noqa: F401  (fail early if the model isn't installed)
+        self._sr = sr
+        self._recognizer = sr.Recognizer()
+        self.keyword_entries = [(keyword.lower(), sensitivity)]
+
+    def __call__(self, pcm: bytes, sample_rate: int) -> bool:
+        audio = self._sr.AudioData(pcm, sample_rate, 2)
+        try:
+            return bool(self._recognizer.recognize_sphinx(audio, keyword_entries=self.keyword_entries).strip())
+        except self._sr.UnknownValueError:
+            return False
+
+class TranscriptKeywordMatcher:
+    """Transcribes the burst with any STTEngine and looks for the keyword in the text."""
+
+    def __init__(self, keyword: str, engine: STTEngine):
+        self.keyword = keyword.lower()
+        self.engine = engine
+
+    def __call__(self, pcm: bytes, sample_rate: int) -> bool:
+        try:
+            return self.keyword in self.engine.transcribe_pcm(pcm, sample_rate).lower()
+        except Exception:
+            return False
+
+class KeywordSpotter:
+    """
+    Wake-word detection on a live PCM stream.
+
+    Audio goes into a ring buffer and through the energy gate; nothing else
+    runs while the room is quiet. When a voiced burst ends that is about as
+    long as a wake word (`min_speech_ms`..`max_speech_ms`), that stretch of
+    the ring buffer, plus `preroll_ms` before the onset, is handed to
+    `matcher(pcm, sample_rate)`. Longer speech is ignored.
+    """
+
+    def __init__(self, matcher, sample_rate: int = 16000, vad: Optional[EnergyVAD] = None,
+                 hangover_ms: int = 300, min_speech_ms: int = 200, max_speech_ms: int = 1500,
+                 preroll_ms: int = 200):
+        self.matcher = matcher
+        self.sample_rate = sample_rate
+        self.vad = vad or EnergyVAD(sample_rate)
+        self.hangover_ms = hangover_ms
+        self.min_speech_ms = min_speech_ms
+        self.max_speech_ms = max_speech_ms
+        self.preroll_ms = preroll_ms
+        ms_bytes = self.vad.frame_bytes // self.vad.frame_ms
+        self._ms_bytes = ms_bytes
+        self.ring = AudioRingBuffer((preroll_ms + max_speech_ms + hangover_ms + self.vad.frame_ms) * ms_bytes)
+        self._pending = b""
+        self._segment_ms = 0  # 0 = no burst in progress
+        self._silence_ms = 0
+        self.frames = 0
+        self.matcher_calls = 0
+
+    def calibrate(self, chunks, factor: float = 3.0):
+        """Set the gate to `factor` x the RMS of ambient-noise chunks (never below the default)."""
+        pcm = b"".join(chunks)
+        samples = np.frombuffer(pcm[:len(pcm) // 2 * 2], dtype="<i2").astype(np.float32)
+        if samples.size:
+            self.vad.threshold = max(self.vad.threshold, factor * float(np.sqrt(np.mean(samples * samples))))
 
-    def text_to_speech(self, text: str):
-        pass
+    def feed(self, chunk: bytes) -> bool:
+        """Process a chunk; True if the wake word ended within it."""
+        data = self._pending + chunk
+        size = self.vad.frame_bytes
+        usable = len(data) - len(data) % size
+        self._pending = data[usable:]
+        detected = False
+        for start in range(0, usable, size):
+            frame = data[start:start + size]
+            self.ring.write(frame)
+            self.frames += 1
+            if self.vad.is_speech(frame):
+                self._segment_ms += self.vad.frame_ms
+                self._silence_ms = 0
+            elif self._segment_ms:
+                self._segment_ms += self.vad.frame_ms
+                self._silence_ms += self.vad.frame_ms
+                if self._silence_ms >= self.hangover_ms:
+                    detected = self._check_burst() or detected
+        return detected
 
-    def speech_to_text(self, audio_data):
-        pass
+    def _check_burst(self) -> bool:
+        voiced_ms = self._segment_ms - self._silence_ms
+        segment_ms = self._segment_ms
+        self._segment_ms = self._silence_ms = 0
+        # Too short (a click) or too long (ordinary speech) to be the wake word
+        if not self.min_speech_ms <= voiced_ms <= self.max_speech_ms:
+            return False
+        self.matcher_calls += 1
+        return self.matcher(self.ring.last((segment_ms + self.preroll_ms) * self._ms_bytes), self.sample_rate)
@@ -0,0 +1,283 @@
+"""
+Load test and latency benchmark for the Medsy API.
+
+Drives /chat/, /appointments/process and /voice/transcribe with a weighted
+mix of realistic traffic, either in-process through the ASGI app or against
+a running uvicorn server, and reports p50/p95/p99 latency, throughput and
+per-stage timings (from the Server-Timing header).
+
+Examples:
+    python benchmarks/bench_api.py --requests 500 --concurrency 16
+    python benchmarks/bench_api.py --url http://localhost:8000 --duration 30
+    python benchmarks/bench_api.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_api.py --compare benchmarks/baseline.json --max-regression 0.25
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import struct
+import sys
+import time
+import wave
+from collections import defaultdict
+
+import httpx
+
+# Add the project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+API = "/api/v1"
+
+CHAT_MESSAGES = [
+    "Hello Medsy",
+    "hi",
+    "I have a fever",
+    "I've been coughing a lot and my throat is sore",
+    "My head hurts, pain is 6/10",
+    "What are the side effects of ibuprofen?",
+    "What are your opening hours?",
+    "Cancel my appointment",
+    "I'm really worried, I feel dizzy and weak",
+    "I have chest pain and shortness of breath",
+    "Tell me about medications",
+]
+
+BOOKING_SCRIPT = ["Book appointment", "Fever", "Tomorrow", "Morning", "No"]
+
+# Relative frequency of each scenario in the mixed workload
+DEFAULT_MIX = {"chat": 0.75, "appointments": 0.20, "voice": 0.05}
+
+def _silent_wav(seconds: float = 0.5, rate: int = 16000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(struct.pack("<h", 0) * int(seconds * rate))
+    return buffer.getvalue()
+
+def percentile(sorted_values, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def parse_server_timing(header: str) -> dict:
+    timings = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur" and name:
+                try:
+                    timings[name] = float(value)
+                except ValueError:
+                    pass
+    return timings
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.stages = defaultdict(list)
+
+    def record(self, endpoint: str, elapsed_ms: float, response: httpx.Response = None, error: bool = False):
+        if error or response is None or response.status_code >= 400:
+            self.errors[endpoint] += 1
+            return
+        self.latencies[endpoint].append(elapsed_ms)
+        for stage, ms in parse_server_timing(response.headers.get("server-timing", "")).items():
+            self.stages[stage].append(ms)
+
+    def summary(self, wall_seconds: float) -> dict:
+        endpoints = {}
+        total = 0
+        for endpoint in sorted(set(self.latencies) | set(self.errors)):
+            values = sorted(self.latencies[endpoint])
+            total += len(values)
+            endpoints[endpoint] = {
+                "count": len(values),
+                "errors": self.errors[endpoint],
+                "mean_ms": round(sum(values) / len(values), 2) if values else 0.0,
+                "p50_ms": round(percentile(values, 50), 2),
+                "p95_ms": round(percentile(values, 95), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+                "rps": round(len(values) / wall_seconds, 1) if wall_seconds else 0.0,
+            }
+        stages = {}
+        for stage, values in sorted(self.stages.items()):
+            values = sorted(values)
+            stages[stage] = {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50), 3),
+                "p95_ms": round(percentile(values, 95), 3),
+            }
+        return {
+            "requests": total,
+            "errors": sum(self.errors.values()),
+            "wall_seconds": round(wall_seconds, 2),
+            "rps": round(total / wall_seconds, 1) if wall_seconds else 0.0,
+            "endpoints": endpoints,
+            "stages": stages,
+        }
+
+async def _timed(recorder: Recorder, endpoint: str, send):
+    start = time.perf_counter()
+    try:
+        response = await send()
+    except httpx.HTTPError:
+        recorder.record(endpoint, 0.0, error=True)
+        return None
+    recorder.record(endpoint, (time.perf_counter() - start) * 1000, response)
+    return response
+
+async def _chat(client, recorder, rng, user_id):
+    message = rng.choice(CHAT_MESSAGES)
+    await _timed(recorder, "chat", lambda: client.post(f"{API}/chat/", json={"user_id": user_id, "message": message}))
+
+async def _appointments(client, recorder, rng, user_id):
+    # A whole booking conversation, one request per step
+    for step in BOOKING_SCRIPT:
+        await _timed(recorder, "appointments", lambda: client.post(
+            f"{API}/appointments/process", json={"user_id": user_id, "message": step}))
+    await client.delete(f"{API}/appointments/reset/{user_id}")
+
+async def _voice(client, recorder, rng, user_id, audio=_silent_wav()):
+    files = {"file": ("bench.wav", audio, "audio/wav")}
+    await _timed(recorder, "voice", lambda: client.post(f"{API}/voice/transcribe", files=files))
+
+SCENARIOS = {"chat": _chat, "appointments": _appointments, "voice": _voice}
+
+async def _worker(worker_id, client, recorder, mix, deadline, budget, seed):
+    rng = random.Random(seed + worker_id)
+    names, weights = zip(*mix.items())
+    # Offset user ids per worker so booking sessions never collide
+    user_id = 100000 + worker_id * 1000
+    while time.perf_counter() < deadline:
+        if budget is not None:
+            if budget[0] <= 0:
+                return
+            budget[0] -= 1
+        user_id += 1
+        scenario = rng.choices(names, weights)[0]
+        await SCENARIOS[scenario](client, recorder, rng, user_id)
+
+async def run_benchmark(url=None, concurrency=8, duration=None, requests=None, mix=None, warmup=20, seed=42) -> dict:
+    mix = mix or DEFAULT_MIX
+    recorder = Recorder()
+
+    if url:
+        client = httpx.AsyncClient(base_url=url, timeout=30.0, limits=httpx.Limits(max_connections=concurrency))
+        lifespan = None
+    else:
+        from app.main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=30.0)
+        lifespan = app.router.lifespan_context(app)
+
+    async with client:
+        if lifespan is not None:
+            await lifespan.__aenter__()
+        try:
+            # Untimed warm-up so first-request effects don't skew the percentiles
+            warm = Recorder()
+            for i in range(warmup):
+                await _chat(client, warm, random.Random(i), 1)
+
+            budget = [requests] if requests is not None else None
+            deadline = time.perf_counter() + (duration if duration is not None else float("inf"))
+            start = time.perf_counter()
+            await asyncio.gather(*(
+                _worker(i, client, recorder, mix, deadline, budget, seed) for i in range(concurrency)
+            ))
+            wall = time.perf_counter() - start
+        finally:
+            if lifespan is not None:
+                await lifespan.__aexit__(None, None, None)
+
+    result = recorder.summary(wall)
+    result["config"] = {
+        "target": url or "in-process",
+        "concurrency": concurrency,
+        "mix": mix,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+    return result
+
+def compare(current: dict, baseline: dict, max_regression: float) -> list:
+    """Return human-readable regressions of p95 latency or throughput beyond the tolerance."""
+    problems = []
+    for endpoint, base in baseline.get("endpoints", {}).items():
+        now = current.get("endpoints", {}).get(endpoint)
+        if not now:
+            continue
+        if base["p95_ms"] and now["p95_ms"] > base["p95_ms"] * (1 + max_regression):
+            problems.append(f"{endpoint}: p95 {now['p95_ms']}ms vs baseline {base['p95_ms']}ms")
+        if now["errors"] > base.get("errors", 0):
+            problems.append(f"{endpoint}: {now['errors']} errors vs baseline {base.get('errors', 0)}")
+    if baseline.get("rps") and current["rps"] < baseline["rps"] * (1 - max_regression):
+        problems.append(f"throughput {current['rps']} rps vs baseline {baseline['rps']} rps")
+    return problems
+
+def print_report(result: dict):
+    print(f"\n{result['requests']} requests in {result['wall_seconds']}s "
+          f"({result['rps']} req/s, {result['errors']} errors) against {result['config']['target']}")
+    print(f"{'endpoint':<14}{'count':>7}{'err':>5}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'rps':>8}")
+    for name, s in result["endpoints"].items():
+        print(f"{name:<14}{s['count']:>7}{s['errors']:>5}{s['mean_ms']:>9}{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}{s['rps']:>8}")
+    if result["stages"]:
+        print(f"\n{'stage':<16}{'count':>7}{'p50':>10}{'p95':>10}")
+        for name, s in result["stages"].items():
+            print(f"{name:<16}{s['count']:>7}{s['p50_ms']:>10}{s['p95_ms']:>10}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Medsy API.")
+    parser.add_argument("--url", help="base URL of a running server (default: in-process ASGI)")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, help="run for this many seconds")
+    parser.add_argument("--requests", type=int, help="run this many scenarios in total (default 400)")
+    parser.add_argument("--mix", help='JSON weights, e.g. \'{"chat": 1.0}\'')
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", dest="json_out", help="write the full result to this file")
+    parser.add_argument("--save-baseline", help="store the result as the new baseline")
+    parser.add_argument("--compare", help="baseline file to check for regressions")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="allowed fractional slowdown")
+    args = parser.parse_args(argv)
+
+    if args.duration is None and args.requests is None:
+        args.requests = 400
+
+    result = asyncio.run(run_benchmark(
+        url=args.url,
+        concurrency=args.concurrency,
+        duration=args.duration,
+        requests=args.requests,
+        mix=json.loads(args.mix) if args.mix else None,
+        seed=args.seed,
+    ))
+    print_report(result)
+
+    for path in filter(None, [args.json_out, args.save_baseline]):
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResult written to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            problems = compare(result, json.load(f), args.max_regression)
+        if problems:
+            print("\nPerformance regressions:")
+            for problem in problems:
+                print(f"  - {problem}")
+            return 1
+        print(f"\nNo regressions beyond {args.max_regression:.0%} against {args.compare}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+Local stand-in for an OpenAI-compatible /v1/chat/completions endpoint, for
+tests and benchmarks without network access or an API key.
+
+Run it and point the API at it:
+    python benchmarks/llm_stub.py --port 8100 --delay-ms 300
+    LLM_BACKEND=openai LLM_BASE_URL=http://localhost:8100 uvicorn app.main:app
+
+In tests, mount `create_stub_app(...)` on an httpx.ASGITransport instead.
+"""
+import argparse
+import asyncio
+import json
+import re
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+def create_stub_app(delay: float = 0.0, fail_first: int = 0, fail_status: int = 503) -> FastAPI:
+    """
+    `delay` seconds are added to every call (a slow upstream); the first
+    `fail_first` calls answer `fail_status` (a flaky one). Requests with
+    "stream": true get one SSE chunk per word, `delay` apart.
+    """
+    app = FastAPI(title="LLM stub")
+    app.state.calls = 0
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        app.state.calls += 1
+        if delay:
+            await asyncio.sleep(delay)
+        if app.state.calls <= fail_first:
+            return JSONResponse({"error": {"message": "stub failure"}}, status_code=fail_status)
+        user_prompt = body["messages"][-1]["content"]
+        question = user_prompt.rsplit("User: ", 1)[-1]
+        reply = f"(stub) You said: {question}"
+        if body.get("stream"):
+            return StreamingResponse(_sse(reply, delay), media_type="text/event-stream")
+        return {
+            "id": f"stub-{app.state.calls}",
+            "object": "chat.completion",
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop",
+            }],
+        }
+
+    return app
+
+async def _sse(reply: str, delay: float):
+    for word in re.findall(r"\S+\s*", reply):
+        chunk = {"choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]}
+        yield f"data: {json.dumps(chunk)}\n\n"
+        if delay:
+            await asyncio.sleep(delay)
+    yield "data: [DONE]\n\n"
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the stub LLM server.")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="latency added to every call")
+    parser.add_argument("--fail-first", type=int, default=0, help="answer the first N calls with 503")
+    args = parser.parse_args()
+    uvicorn.run(create_stub_app(args.delay_ms / 1000, args.fail_first), port=args.port)
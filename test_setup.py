@@ -7,18 +7,16 @@ sys.path.append(os.getcwd())
 try:
     from app.main import app
     from app.core.config import settings
-    from app.models.base import Base
     from app.models import User, Appointment, Symptom, Medication, ChatHistory
-    from sqlalchemy import create_engine
+    from app.models.database import init_db
     
     print("✅ Successfully imported application modules.")
     print(f"✅ Project Name: {settings.PROJECT_NAME}")
     print(f"✅ Database URL: {settings.DATABASE_URL}")
     
     # Check Database Models
-    engine = create_engine(settings.DATABASE_URL)
-    # Create tables to verify schema matches
-    Base.metadata.create_all(bind=engine)
+    # Create tables (and apply migrations) to verify the schema
+    init_db()
     print("✅ Successfully created database tables (Schema verified).")
     
     # Check Routes
@@ -0,0 +1,15 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+# The engine, log file and caches are configured when `app` is imported, so
+# point them at a scratch directory before any test module imports it;
+# test runs must not touch ./medsy.db or leave files in the checkout.
+_scratch = tempfile.mkdtemp(prefix="medsy-tests-")
+atexit.register(shutil.rmtree, _scratch, ignore_errors=True)
+
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_scratch}/medsy.db")
+os.environ.setdefault("LOG_FILE", os.path.join(_scratch, "app.log"))
+os.environ.setdefault("SESSION_DB_PATH", os.path.join(_scratch, "sessions.db"))
+os.environ.setdefault("TTS_CACHE_DIR", os.path.join(_scratch, "tts_cache"))
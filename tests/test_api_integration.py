@@ -29,3 +29,144 @@ def test_appointment_booking_flow():
     # 2. Provide problem
     response = client.post("/api/v1/appointments/process", json={"user_id": 123, "message": "Headache"})
     assert response.json()['state'] == "DATE_SELECTION"
+
+def test_readiness_after_startup_warmup():
+    with TestClient(app) as warm_client:
+        response = warm_client.get("/ready")
+        assert response.status_code == 200
+        data = response.json()
+        assert data['status'] == "ready"
+        assert set(data['models']) == {"intent_classifier", "sentiment_analyzer"}
+
+def test_chat_slim_sentiment_detail():
+    response = client.post("/api/v1/chat/", json={"user_id": 1, "message": "Hello Medsy", "sentiment_detail": "summary"})
+    assert response.status_code == 200
+    sentiment = response.json()['sentiment']
+    assert "anxiety_level" in sentiment
+    assert "raw_scores" not in sentiment
+
+    response = client.post("/api/v1/chat/", json={"user_id": 1, "message": "Hello Medsy", "sentiment_detail": "none"})
+    assert response.json()['sentiment'] == {}
+
+def test_chat_stream_emits_verdict_then_tokens():
+    import json
+    with client.stream("POST", "/api/v1/chat/stream", json={"user_id": 2, "message": "I have a fever"}) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        events = [json.loads(line) for line in response.iter_lines() if line]
+    assert events[0]['type'] == "meta"
+    assert events[0]['is_emergency'] is False
+    assert events[-1] == {"type": "done"}
+    text = "".join(e['text'] for e in events if e['type'] == "token")
+    assert "fever" in text.lower()
+    assert sum(e['type'] == "token" for e in events) > 1
+
+def test_benchmark_harness_in_process():
+    import asyncio
+    from benchmarks.bench_api import run_benchmark, compare
+    result = asyncio.run(run_benchmark(concurrency=2, requests=6, mix={"chat": 1.0}, warmup=0))
+    assert result['errors'] == 0
+    assert result['endpoints']['chat']['count'] == 6
+    assert "intent" in result['stages']
+    assert compare(result, result, 0.25) == []
+
+def test_metrics_endpoint_exposes_stage_latency():
+    client.post("/api/v1/chat/", json={"user_id": 3, "message": "I have a fever"})
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'medsy_stage_duration_seconds_count{stage="predict"}' in body
+    assert 'medsy_http_request_duration_seconds_bucket{method="POST",route="/chat/",status="200"' in body
+
+def test_chat_history_endpoint_pages_newest_first():
+    import uuid
+    user_id = uuid.uuid4().int % 10**9  # the database file outlives test runs
+    for message in ["Hello Medsy", "What are your opening hours?"]:
+        client.post("/api/v1/chat/", json={"user_id": user_id, "message": message})
+    response = client.get(f"/api/v1/chat/history/{user_id}", params={"limit": 3})
+    assert response.status_code == 200
+    page = response.json()
+    assert [t["sender"] for t in page["items"]] == ["bot", "user", "bot"]
+    assert page["items"][1]["message"] == "What are your opening hours?"
+    assert page["next_cursor"]
+
+    older = client.get(f"/api/v1/chat/history/{user_id}", params={"limit": 3, "cursor": page["next_cursor"]}).json()
+    assert [t["message"] for t in older["items"]] == ["Hello Medsy"]
+    assert older["next_cursor"] is None
+    assert client.get(f"/api/v1/chat/history/{user_id}", params={"cursor": "bogus"}).status_code == 400
+
+def test_voice_transcribe_leaves_no_temp_files():
+    import io
+    import wave
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(16000)
+        wav.writeframes(b"\x00\x00" * 8000)
+    before = set(os.listdir("."))
+    response = client.post("/api/v1/voice/transcribe", files={"file": ("clip.wav", buf.getvalue(), "audio/wav")})
+    assert response.status_code == 200
+    assert response.json() == {"transcription": "[0.5s of audio]"}
+    assert set(os.listdir(".")) == before
+
+    response = client.post("/api/v1/voice/transcribe", files={"file": ("clip.wav", b"not audio", "audio/wav")})
+    assert response.status_code == 400
+
+def test_voice_transcribe_rejects_oversized_upload_from_content_length(monkeypatch):
+    from app.routers import voice
+    monkeypatch.setattr(voice.voice_service, "max_upload_bytes", 1024)
+    body = b"\x00" * (64 * 1024)
+    response = client.post("/api/v1/voice/transcribe", files={"file": ("clip.wav", body, "audio/wav")})
+    assert response.status_code == 413
+    # Without the field the form is rejected rather than crashing
+    assert client.post("/api/v1/voice/transcribe", data={"other": "x"}).status_code == 422
+
+def test_voice_stream_pushes_partial_and_final_transcripts():
+    import numpy as np
+    from starlette.websockets import WebSocketDisconnect
+    tone = (np.sin(np.arange(16000) / 5) * 3000).astype("<i2").tobytes()
+    with client.websocket_connect("/api/v1/voice/stream?sample_rate=16000&user_id=3") as ws:
+        for start in range(0, len(tone), 3200):
+            ws.send_bytes(tone[start:start + 3200])
+        ws.send_text("end")
+        events = []
+        try:
+            while True:
+                events.append(ws.receive_json())
+        except WebSocketDisconnect:
+            pass
+    assert events[-1]["type"] == "final"
+    assert events[-1]["text"] == "[1.0s of audio]"
+    assert events[-1]["is_emergency"] is False
+    assert "intent" in events[-1]["intent"]
+
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/api/v1/voice/stream?sample_rate=0") as ws:
+            ws.receive_json()
+
+def test_voice_speak_serves_cached_audio():
+    first = client.post("/api/v1/voice/speak", json={"text": "Please describe your symptoms."})
+    assert first.status_code == 200
+    assert first.headers["content-type"] == "audio/wav"
+    assert first.content[:4] == b"RIFF"
+    again = client.post("/api/v1/voice/speak", json={"text": "Please describe your symptoms."})
+    assert again.headers["etag"] == first.headers["etag"]
+    # Evicted or deleted audio is rendered again instead of failing the send
+    from app.routers.voice import voice_service
+    os.remove(voice_service.tts_cache.path(first.headers["etag"].strip('"')))
+    regenerated = client.post("/api/v1/voice/speak", json={"text": "Please describe your symptoms."})
+    assert regenerated.status_code == 200 and regenerated.content == first.content
+    assert client.post("/api/v1/voice/speak", json={"text": ""}).status_code == 422
+
+def test_emergency_skips_other_stages():
+    response = client.post("/api/v1/chat/", json={"user_id": 7, "message": "I have severe chest pain and can't breathe"})
+    assert response.json()["is_emergency"] is True
+    assert [part.split(";")[0] for part in response.headers["Server-Timing"].split(", ")] == ["emergency"]
+
+def test_mock_backend_skips_context_stage():
+    response = client.post("/api/v1/chat/", json={"user_id": 8, "message": "I have a mild fever"})
+    assert response.status_code == 200
+    stages = [part.split(";")[0] for part in response.headers["Server-Timing"].split(", ")]
+    assert "response" in stages and "context" not in stages
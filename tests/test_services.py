@@ -45,3 +45,779 @@ def test_medication_reminder():
     reminders = reminder.get_reminders_for_day("u1", datetime.now())
     assert len(reminders) == 1
     assert "Aspirin" in reminders[0]
+
+def test_phrase_matcher_single_pass():
+    from app.services.phrase_matcher import PhraseMatcher
+    matcher = PhraseMatcher({"a": ["he", "she", "hers"], "b": ["his", "she"]})
+    hits = matcher.scan("uShers")
+    assert (1, 4, "she", "a") in hits
+    assert (1, 4, "she", "b") in hits
+    assert (2, 4, "he", "a") in hits
+    assert (2, 6, "hers", "a") in hits
+    assert matcher.hits_by_table("his hers") == {"a": ["he", "hers"], "b": ["his"]}
+
+def test_emergency_detection_matches_substring_rules(emergency_detector):
+    result = emergency_detector.check_symptoms("I had a SEIZURE and now severe headache with confusion")
+    assert "Possible Stroke" in result['conditions_detected']
+    assert "Critical Symptom: seizure" in result['conditions_detected']
+    assert result['severity_score'] == 10
+    assert emergency_detector.check_symptoms("just a runny nose")['is_emergency'] is False
+
+def test_intent_predict_batch_matches_single(intent_classifier):
+    texts = ["Cancel my appointment", "I want to book an appointment", "What are your opening hours?"]
+    batch = intent_classifier.predict_batch(texts)
+    assert [r['intent'] for r in batch] == [intent_classifier.predict(t)['intent'] for t in texts]
+    assert intent_classifier.predict_batch([]) == []
+
+def test_intent_linear_backend(tmp_path):
+    classifier = IntentClassifier(model_path=str(tmp_path / "intent_linear.pkl"), backend="linear")
+    results = classifier.predict_batch(["Cancel my appointment", "Side effects of Ibuprofen"])
+    assert [r['intent'] for r in results] == ["cancel_appointment", "ask_medication_info"]
+    assert os.path.exists(tmp_path / "intent_linear.pkl")
+
+def test_micro_batcher_groups_concurrent_calls():
+    import asyncio
+    from app.services.micro_batcher import MicroBatcher
+    calls = []
+
+    def batch_fn(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    async def run():
+        batcher = MicroBatcher(batch_fn, max_batch_size=8, max_wait_ms=5)
+        return await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+
+    assert asyncio.run(run()) == [0, 2, 4, 6, 8]
+    assert calls == [[0, 1, 2, 3, 4]]
+
+    async def short_results():
+        batcher = MicroBatcher(lambda items: items[:1], max_batch_size=8, max_wait_ms=5)
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True), 1)
+
+    # A result-count mismatch fails every caller instead of hanging some
+    assert all(isinstance(r, ValueError) for r in asyncio.run(short_results()))
+
+def test_run_in_process_falls_back_to_thread_pool():
+    import asyncio
+    import threading
+    from app.core import executors
+
+    async def run():
+        return await executors.run_in_process(threading.current_thread)
+
+    # CPU_PROCESS_POOL_SIZE defaults to 0, so the stage runs on a pool thread
+    worker = asyncio.run(run())
+    assert worker.name.startswith("medsy-cpu")
+    executors.shutdown_executors()
+
+def test_process_pool_preload_stays_lightweight():
+    import subprocess
+    from app.core.executors import PROCESS_POOL_PRELOAD
+
+    # What each spawned worker imports: no routers, database or HTTP client
+    script = (
+        "import importlib, sys\n"
+        f"for name in {PROCESS_POOL_PRELOAD!r}: importlib.import_module(name)\n"
+        "print(' '.join(sorted(sys.modules)))"
+    )
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    loaded = subprocess.run([sys.executable, "-c", script], cwd=root, capture_output=True, text=True, check=True).stdout.split()
+    assert not [m for m in loaded if m.startswith(("app.routers", "app.core.db", "app.core.sessions", "sqlalchemy", "httpx"))]
+
+def test_analysis_graph_runs_only_requested_stages():
+    import asyncio
+    from app.services.analysis_graph import AnalysisGraph, Stage
+    ran = []
+
+    def make(name):
+        async def stage(inputs, **deps):
+            ran.append(name)
+            return f"{name}:{inputs['message']}:{sorted(deps)}"
+        return stage
+
+    stages = [
+        Stage("a", make("a")),
+        Stage("b", make("b")),
+        Stage("c", make("c"), requires=("a",)),
+    ]
+
+    async def run():
+        graph = AnalysisGraph(stages, message="hi")
+        result = await graph.get("c")
+        return result, graph.timings
+
+    result, timings = asyncio.run(run())
+    assert result == "c:hi:['a']"
+    assert sorted(ran) == ["a", "c"]
+    assert set(timings) == {"a", "c"}
+
+def test_memory_session_store_evicts_lru_and_expired():
+    from app.core.sessions import MemorySessionStore
+    from app.services.appointment_flow import AppointmentBookingFlow
+    store = MemorySessionStore(max_entries=2, ttl_seconds=3600)
+    for user_id in (1, 2, 3):
+        store.save(user_id, AppointmentBookingFlow())
+    assert 1 not in store and 2 in store and 3 in store
+
+    expiring = MemorySessionStore(max_entries=10, ttl_seconds=0)
+    expiring.save(1, AppointmentBookingFlow())
+    assert expiring.get(1) is None
+
+def test_get_or_create_session_reports_creation_without_storing():
+    import asyncio
+    from app.core import sessions
+    from app.core.sessions import SessionStore
+    from app.services.appointment_flow import AppointmentBookingFlow
+
+    with pytest.raises(TypeError):
+        SessionStore()  # get/save/delete are abstract
+
+    async def scenario():
+        flow, created = await sessions.get_or_create_session(4321)
+        assert created and await sessions.get_session(4321) is None
+        flow.process_input("Book appointment")
+        await sessions.save_session(4321, flow)
+        again, created = await sessions.get_or_create_session(4321)
+        await sessions.delete_session(4321)
+        return again.state, created
+
+    state, created = asyncio.run(scenario())
+    assert state == AppointmentBookingFlow.PROBLEM_SELECTION and not created
+
+def test_sqlite_session_store_round_trip(tmp_path):
+    from app.core.sessions import SQLiteSessionStore
+    from app.services.appointment_flow import AppointmentBookingFlow
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+    flow = AppointmentBookingFlow()
+    flow.process_input("Book appointment")
+    flow.process_input("Fever")
+    store.save(7, flow)
+
+    # A second store on the same file stands in for another worker
+    other = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+    restored = other.get(7)
+    assert restored.state == AppointmentBookingFlow.DATE_SELECTION
+    assert restored.booking_data["problem"] == "Fever"
+
+    other.delete(7)
+    assert store.get(7) is None
+    store.close()
+    other.close()
+
+def test_booking_flow_state_round_trip():
+    from app.services.appointment_flow import AppointmentBookingFlow
+    flow = AppointmentBookingFlow()
+    for message in ["Book appointment", "Headache", "Tomorrow", "Morning", "No"]:
+        flow.process_input(message)
+    assert flow.state == AppointmentBookingFlow.COMPLETED
+    assert not hasattr(flow, "__dict__")
+
+    restored = AppointmentBookingFlow.from_bytes(flow.to_bytes())
+    assert restored.state == flow.state
+    assert restored.booking_data == flow.booking_data
+    assert restored.booking_data["doctor"] == AppointmentBookingFlow.DOCTOR
+    assert len(flow.to_bytes()) < 100
+
+def test_jargon_translator_single_scan_and_glossary(tmp_path):
+    from app.services.jargon_translator import MedicalJargonTranslator
+    result = MedicalJargonTranslator().translate("Patient has ACUTE hypertension and edema.")
+    assert [t['term'] for t in result['terms_identified']] == ["hypertension", "acute", "edema"]
+    assert "high blood pressure" in result['simple_summary']
+
+    glossary = tmp_path / "glossary.csv"
+    glossary.write_text("term,explanation\nAtrial Fibrillation,Irregular heartbeat\n")
+    translator = MedicalJargonTranslator(glossary_path=str(glossary))
+    terms = translator.translate("History of atrial fibrillation")['terms_identified']
+    assert terms == [{"term": "atrial fibrillation", "explanation": "Irregular heartbeat"}]
+
+def test_json_log_formatter_and_sampling():
+    import json
+    import logging
+    from app.core.logging_config import JsonFormatter, SamplingFilter
+
+    record = logging.makeLogRecord({"name": "app.test", "levelno": logging.INFO, "levelname": "INFO",
+                                    "msg": "took %sms", "args": (12,), "user_id": 7})
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "took 12ms"
+    assert entry["logger"] == "app.test"
+    assert entry["user_id"] == 7
+
+    sampler = SamplingFilter({"httpx": 0.25})
+    info = [logging.makeLogRecord({"name": "httpx._client", "levelno": logging.INFO}) for _ in range(8)]
+    assert sum(sampler.filter(r) for r in info) == 2
+    assert sampler.filter(logging.makeLogRecord({"name": "httpx", "levelno": logging.WARNING}))
+    assert sampler.filter(logging.makeLogRecord({"name": "app.chat", "levelno": logging.INFO}))
+
+def test_persist_confirmed_booking():
+    import asyncio
+    from sqlalchemy import select
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from app.core.db import create_db_engine
+    from app.models import Base, Appointment, User
+    from app.services.appointment_flow import AppointmentBookingFlow
+    from app.services.persistence import parse_slot, save_appointment
+
+    now = datetime(2026, 3, 10, 12, 0)
+    assert parse_slot("Tomorrow", "Evening", now) == datetime(2026, 3, 11, 18, 0)
+    assert parse_slot("Jan 05", "Morning", now) == datetime(2027, 1, 5, 9, 0)
+    assert parse_slot("next week sometime", "Morning", now) is None
+
+    async def scenario():
+        engine = create_db_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        flow = AppointmentBookingFlow()
+        for step in ["Book", "Fever", "Today", "Morning", "No"]:
+            flow.process_input(step)
+        async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+            # Foreign keys are enforced: the user row is created on demand
+            await save_appointment(db, 42, flow)
+            await save_appointment(db, 42, flow)
+            appointment = (await db.execute(select(Appointment))).scalars().first()
+            assert (await db.execute(select(User.user_id))).scalars().all() == [42]
+        await engine.dispose()
+        return appointment
+
+    appointment = asyncio.run(scenario())
+    assert appointment.user_id == 42
+    assert appointment.problem_category == "Fever"
+    assert appointment.date.hour == 9
+
+def test_chat_history_buffer_batches_and_flushes_on_stop():
+    import asyncio
+    from sqlalchemy import select
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from app.core.db import create_db_engine
+    from app.models import Base, ChatHistory
+    from app.services.chat_history import ChatHistoryBuffer
+
+    async def scenario():
+        engine = create_db_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        writes = []
+
+        class CountingSession:
+            def __call__(self):
+                writes.append(1)
+                return sessions()
+
+        buffer = ChatHistoryBuffer(CountingSession(), max_batch=4, flush_interval=60, max_queue=100)
+        await buffer.add(1, "before start", "written through", "greeting")
+        assert len(writes) == 1
+
+        buffer.start()
+        for i in range(5):
+            await buffer.add(1, f"message {i}", "reply", "general")
+        assert len(writes) == 1  # nothing written inline once started
+        await asyncio.sleep(0.05)  # size threshold hit: 10 rows drained in batches of 4
+        assert len(writes) == 4
+        assert buffer.pending() == 0
+
+        await buffer.add(1, "late", "reply", "general")
+        await buffer.stop()  # flushes what the timer hasn't yet
+        assert len(writes) == 5
+
+        async with sessions() as db:
+            rows = (await db.execute(select(ChatHistory).order_by(ChatHistory.message_id))).scalars().all()
+        await engine.dispose()
+        return rows
+
+    rows = asyncio.run(scenario())
+    assert len(rows) == 14
+    assert rows[0].sender == "user" and rows[1].sender == "bot"
+    assert rows[-1].intent_detected == "general"
+
+def test_migrations_upgrade_legacy_schema(tmp_path):
+    import asyncio
+    import sqlite3
+    from sqlalchemy import inspect, text
+    from app.core.db import create_db_engine, init_db
+
+    path = tmp_path / "legacy.db"
+    legacy = sqlite3.connect(path)
+    legacy.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, full_name VARCHAR, email VARCHAR,
+            hashed_password VARCHAR, phone_number VARCHAR, created_at DATETIME);
+        CREATE UNIQUE INDEX ix_users_email ON users (email);
+        CREATE TABLE chat_history (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users (id),
+            message VARCHAR, sender VARCHAR, timestamp DATETIME);
+        CREATE TABLE appointments (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users (id),
+            doctor_name VARCHAR, appointment_date DATETIME, reason VARCHAR, status VARCHAR);
+        INSERT INTO users (id, full_name, email) VALUES (7, 'Asha', 'asha@example.com');
+        INSERT INTO chat_history (id, user_id, message, sender) VALUES (1, 7, 'hi', 'user');
+        INSERT INTO chat_history (id, user_id, message, sender) VALUES (2, 9, 'orphan', 'user');
+        INSERT INTO appointments (id, user_id, doctor_name, reason) VALUES (3, 7, 'Dr. Rao', 'checkup');
+    """)
+    legacy.close()
+
+    async def scenario():
+        engine = create_db_engine(f"sqlite+aiosqlite:///{path}")
+        await init_db(engine)
+        await init_db(engine)  # already current
+        async with engine.connect() as conn:
+            result = {
+                "users": (await conn.execute(text("SELECT user_id, name FROM users ORDER BY user_id"))).fetchall(),
+                "chat": (await conn.execute(text("SELECT message_id, user_id, message_text FROM chat_history"))).fetchall(),
+                "appointments": (await conn.execute(text("SELECT appointment_id, user_id, description FROM appointments"))).fetchall(),
+                "foreign_keys": (await conn.execute(text("PRAGMA foreign_keys"))).scalar(),
+                "indexes": await conn.run_sync(lambda c: {ix["name"] for ix in inspect(c).get_indexes("chat_history")}),
+                "references": await conn.run_sync(lambda c: {fk["referred_table"] for fk in inspect(c).get_foreign_keys("appointments")}),
+            }
+            # Enforcement is back on for the pooled connection
+            try:
+                await conn.execute(text("INSERT INTO appointments (user_id, doctor_name) VALUES (404, 'x')"))
+                result["orphan_rejected"] = False
+            except Exception:
+                result["orphan_rejected"] = True
+        await engine.dispose()
+        return result
+
+    result = asyncio.run(scenario())
+    assert result["users"] == [(7, "Asha"), (9, None)]
+    assert result["chat"] == [(1, 7, "hi"), (2, 9, "orphan")]
+    assert result["appointments"] == [(3, 7, "checkup")]
+    assert result["foreign_keys"] == 1 and result["orphan_rejected"]
+    assert result["references"] == {"users"}
+    assert "ix_chat_history_user_timestamp" in result["indexes"]
+
+def test_fetch_history_keyset_pages_and_recent_cache():
+    import asyncio
+    from contextlib import asynccontextmanager
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from app.core.db import create_db_engine
+    from app.models import Base
+    from app.services.chat_history import ChatHistoryBuffer, fetch_history, decode_cursor
+
+    async def scenario():
+        engine = create_db_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        queries = []
+
+        @asynccontextmanager
+        async def session_factory():
+            queries.append(1)
+            async with sessions() as db:
+                yield db
+
+        buffer = ChatHistoryBuffer(session_factory, recent_turns=4)
+        for i in range(5):
+            await buffer.add(1, f"q{i}", f"a{i}")
+        await buffer.add(2, "other user", "reply")
+
+        async with sessions() as db:
+            page1, cursor = await fetch_history(db, 1, limit=4)
+            page2, cursor2 = await fetch_history(db, 1, limit=4, cursor=cursor)
+            page3, cursor3 = await fetch_history(db, 1, limit=4, cursor=cursor2)
+
+        writes = len(queries)
+        recent = await buffer.recent(1)       # loaded from the database once
+        await buffer.add(1, "q5", "a5")       # then kept current on write
+        recent_after = await buffer.recent(1)
+        await engine.dispose()
+        return page1, page2, page3, cursor3, recent, recent_after, len(queries) - writes
+
+    page1, page2, page3, last_cursor, recent, recent_after, reads = asyncio.run(scenario())
+    assert [t["message"] for t in page1] == ["a4", "q4", "a3", "q3"]
+    assert [t["message"] for t in page2] == ["a2", "q2", "a1", "q1"]
+    assert [t["message"] for t in page3] == ["a0", "q0"]
+    assert last_cursor is None
+    assert [t["message"] for t in recent] == ["q3", "a3", "q4", "a4"]
+    assert [t["message"] for t in recent_after] == ["q4", "a4", "q5", "a5"]
+    assert reads == 2  # the initial load plus the write-through of q5; no re-read
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+def test_context_builder_budget_and_profile():
+    import asyncio
+    from datetime import timedelta
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from app.core.db import create_db_engine
+    from app.models import Base, Appointment, Medication, User
+    from app.services.appointment_flow import AppointmentBookingFlow
+    from app.services.context_builder import ContextBuilder, count_tokens, clip_to_tokens
+
+    assert count_tokens("Take ibuprofen, twice daily.") == count_tokens("Take ibup rofe n , twice daily .")
+    assert clip_to_tokens("one two three four", 2) == "one two…"
+
+    class FakeHistory:
+        def __init__(self):
+            self.turns = []
+
+        async def recent(self, user_id):
+            return self.turns if user_id == 5 else []
+
+    history = FakeHistory()
+    now = datetime.now()
+    for i in range(6):
+        history.turns.append({"sender": "user", "message": f"question number {i} " + "words " * 10, "timestamp": now + timedelta(seconds=i)})
+
+    async def scenario():
+        engine = create_db_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        async with sessions() as db:
+            db.add(User(user_id=5))
+            db.add(Medication(user_id=5, name="Ibuprofen", dosage="200mg", frequency="twice daily"))
+            db.add(Appointment(user_id=5, date=now + timedelta(days=1), status="Scheduled", problem_category="Fever", doctor_name="Dr. Shrestha"))
+            await db.commit()
+
+        flow = AppointmentBookingFlow()
+        flow.process_input("Book")
+        async def booking_lookup(user_id):
+            return flow if user_id == 5 else None
+
+        builder = ContextBuilder(history, sessions, max_tokens=90, booking_lookup=booking_lookup)
+        context = await builder.build(5)
+        empty = await builder.build(6)
+        await engine.dispose()
+        return context, empty
+
+    context, empty = asyncio.run(scenario())
+    assert empty == "No context yet"
+    assert "- Booking problem selection" in context
+    assert "Upcoming appointment: Fever" in context
+    assert "Takes Ibuprofen 200mg (twice daily)" in context
+    assert count_tokens(context) <= 90
+    assert "question number 5" in context  # newest turns kept first
+    assert "question number 0" not in context
+
+def test_ai_generator_response_cache():
+    from app.services.ai_generator import AIGenerator, RESPONSE_CACHE_REQUESTS
+
+    generator = AIGenerator(api_key="", cache_size=8, cache_ttl=60)
+    calls = []
+    original = generator._mock_reply
+    generator._mock_reply = lambda text: calls.append(text) or original(text)
+
+    hits = RESPONSE_CACHE_REQUESTS.value(result="hit")
+    first = generator.generate_response("I have a fever", "No context yet", {"anxiety_level": 2})
+    again = generator.generate_response("  i have a FEVER!", "No context yet", {"anxiety_level": 3})
+    assert first == again
+    assert len(calls) == 1
+    assert RESPONSE_CACHE_REQUESTS.value(result="hit") == hits + 1
+    # The cached reply still counts as a hit for the rule that produced it
+    assert generator.rules.stats() == {"fever": 2}
+
+    # A different anxiety bucket or an explicit opt-out bypasses the entry
+    generator.generate_response("I have a fever", "No context yet", {"anxiety_level": 8})
+    generator.generate_response("I have a fever", "No context yet", {"anxiety_level": 2}, cacheable=False)
+    assert len(calls) == 3
+
+    # LLM replies depend on the conversation, so they are not shared
+    generator.api_key = "key"
+    generator.generate_response("I have a fever", "User: I was here yesterday", {"anxiety_level": 2})
+    assert len(calls) == 4
+
+def test_llm_backend_retries_breaker_and_fallback():
+    import asyncio
+    import httpx
+    from benchmarks.llm_stub import create_stub_app
+    from app.services.ai_generator import AIGenerator
+    from app.services.llm_backend import BackendUnavailable, LLMBackend, OpenAIChatBackend, CircuitBreaker
+
+    def backend_for(stub, **kwargs):
+        return OpenAIChatBackend("http://llm", transport=httpx.ASGITransport(app=stub), backoff_base=0, **kwargs)
+
+    async def scenario():
+        # Transient 503 is retried transparently
+        flaky = create_stub_app(fail_first=1)
+        generator = AIGenerator(api_key="", backend=backend_for(flaky, max_retries=2))
+        reply = await generator.agenerate_response("I have a fever", "No context yet", {})
+        await generator.aclose()
+        assert reply == "(stub) You said: I have a fever"
+        assert flaky.state.calls == 2
+
+        # A dead upstream falls back to keyword replies, then the breaker stops calling it
+        down = create_stub_app(fail_first=1000)
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        generator = AIGenerator(api_key="", backend=backend_for(down, max_retries=1, breaker=breaker), cache_size=0)
+        replies = [await generator.agenerate_response("I have a fever", "No context yet", {}) for _ in range(3)]
+        await generator.aclose()
+        assert all("fever is usually a sign" in r for r in replies)
+        assert breaker.state == CircuitBreaker.OPEN
+        assert down.state.calls == 4  # 2 calls x 2 attempts; the third never left
+
+        # A half-open trial that never reaches upstream must not wedge the breaker
+        slow = create_stub_app(delay=1)
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        backend = backend_for(slow, breaker=breaker, timeout=0.05, max_concurrency=1)
+        await backend._semaphore.acquire()  # saturated
+        with pytest.raises(BackendUnavailable):
+            await backend.complete("system", "hi")
+        backend._semaphore.release()
+        assert breaker.state == CircuitBreaker.OPEN  # trial given back, not stuck half-open
+        trial = asyncio.ensure_future(backend.complete("system", "hi"))
+        await asyncio.sleep(0.01)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        assert breaker.state == CircuitBreaker.OPEN and breaker.allow()
+        await backend.aclose()
+
+        # SSE deltas come through one by one (ASGITransport buffers the body,
+        # so arrival timing is checked with the gated backend below)
+        slow_words = create_stub_app()
+        generator = AIGenerator(api_key="", backend=backend_for(slow_words))
+        pieces = [p async for p in generator.astream_response("I have a bad fever", "No context yet", {})]
+        assert pieces == ["(stub) ", "You ", "said: ", "I ", "have ", "a ", "bad ", "fever"]
+        cached = [p async for p in generator.astream_response("I have a bad fever", "No context yet", {})]
+        assert "".join(cached) == "".join(pieces) and slow_words.state.calls == 1
+        await generator.aclose()
+
+        generator = AIGenerator(api_key="", backend=backend_for(create_stub_app(fail_first=1000), max_retries=0))
+        fallback = [p async for p in generator.astream_response("I have a fever", "No context yet", {})]
+        assert "".join(fallback).startswith("A fever is usually a sign")
+        await generator.aclose()
+
+        class GatedBackend(LLMBackend):
+            def __init__(self):
+                self.more = asyncio.Event()
+
+            async def stream(self, system_prompt, user_prompt):
+                yield "first "
+                await self.more.wait()
+                yield "second"
+
+        gated = GatedBackend()
+        tokens = AIGenerator(api_key="", backend=gated).astream_response("hi there", "No context yet", {})
+        assert await tokens.__anext__() == "first "  # before the reply is finished
+        gated.more.set()
+        assert [p async for p in tokens] == ["second"]
+
+    asyncio.run(scenario())
+
+def test_response_rule_engine_priorities_and_hits(tmp_path):
+    import json
+    from app.services.response_rules import ResponseRuleEngine
+
+    engine = ResponseRuleEngine()
+    assert engine.respond("My chest hurts").startswith("URGENT")
+    assert engine.respond("My back hurts").startswith("I'm sorry you're in pain")
+    assert engine.respond("fever and chest pain").startswith("A fever")  # higher priority wins
+    assert engine.respond("qwerty").startswith("I'm not exactly sure")
+    assert engine.stats() == {"chest_pain": 1, "pain": 1, "fever": 1, "fallback": 1}
+
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({
+        "fallback": "Sorry?",
+        "rules": [
+            {"name": "sleep", "keywords": ["insomnia", "can't sleep"], "response": "Try a regular bedtime."},
+            {"name": "sleep_pain", "priority": 5, "keywords": ["can't sleep"], "requires": ["pain"], "response": "Pain keeping you up?"},
+        ]
+    }))
+    custom = ResponseRuleEngine.from_file(str(path))
+    assert custom.respond("I CAN'T SLEEP") == "Try a regular bedtime."
+    assert custom.respond("I can't sleep, the pain is bad") == "Pain keeping you up?"
+    assert custom.respond("hello") == "Sorry?"
+
+    yaml_path = tmp_path / "rules.yaml"
+    yaml_path.write_text("- name: thanks\n  keywords: [thank]\n  response: You're welcome!\n")
+    pytest.importorskip("yaml")
+    assert ResponseRuleEngine.from_file(str(yaml_path)).respond("Thank you") == "You're welcome!"
+
+def _wav_bytes(seconds=0.5, rate=16000, samples=None):
+    import io
+    import wave
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(samples if samples is not None else b"\x00\x00" * int(rate * seconds))
+    return buf.getvalue()
+
+def test_voice_service_transcribes_and_limits_queue():
+    import asyncio
+    import io
+    import threading
+    from starlette.datastructures import UploadFile
+    from app.services.voice_service import STTEngine, VoiceBusy, VoiceService, AudioTooLarge
+
+    service = VoiceService(workers=1, max_queue=0, spool_max_bytes=1024)
+
+    async def scenario():
+        # Bigger than the spool limit, so it rolls over to a temp file on disk
+        text = await service.transcribe_upload(UploadFile(io.BytesIO(_wav_bytes(1.5))))
+        assert text == "[1.5s of audio]"
+        with pytest.raises(AudioTooLarge):
+            small = VoiceService(max_upload_bytes=100)
+            await small.transcribe_upload(UploadFile(io.BytesIO(_wav_bytes())))
+
+        release = threading.Event()
+
+        class SlowEngine(STTEngine):
+            def transcribe(self, audio):
+                release.wait(5)
+                return "done"
+
+        service.engine = SlowEngine()
+        first = asyncio.ensure_future(service.transcribe_upload(UploadFile(io.BytesIO(_wav_bytes()))))
+        await asyncio.sleep(0.05)
+        with pytest.raises(VoiceBusy):
+            await service.transcribe_upload(UploadFile(io.BytesIO(_wav_bytes())))
+        release.set()
+        assert await first == "done"
+        # The slot is released again afterwards
+        assert await service.transcribe_upload(UploadFile(io.BytesIO(_wav_bytes()))) == "done"
+
+    asyncio.run(scenario())
+    service.shutdown()
+
+def test_streaming_transcriber_segments_on_silence():
+    import asyncio
+    import numpy as np
+    from app.services.voice_service import EnergyVAD, StreamingTranscriber, VoiceService
+
+    rate = 16000
+    tone = (np.sin(np.arange(rate) / 5) * 3000).astype("<i2").tobytes()  # 1s of speech-level energy
+    silence = b"\x00\x00" * rate
+    service = VoiceService()
+    transcriber = StreamingTranscriber(service, rate, EnergyVAD(rate), hangover_ms=300, partial_interval_ms=500)
+
+    async def scenario():
+        events = []
+        # Leading silence is dropped; odd chunk sizes must not break framing
+        stream = silence[:8000] + tone + silence[:16000] + tone[:16000]
+        for start in range(0, len(stream), 3001):
+            events += await transcriber.feed(stream[start:start + 3001])
+        events += await transcriber.finish()
+        return events
+
+    events = asyncio.run(scenario())
+    service.shutdown()
+    finals = [e["text"] for e in events if e["type"] == "final"]
+    assert finals == ["[1.0s of audio]", "[0.5s of audio]"]
+    assert any(e["type"] == "partial" for e in events)
+    assert asyncio.run(transcriber.finish()) == []
+
+    # A saturated pool skips partials but never drops a final
+    busy = VoiceService(workers=1, max_queue=0)
+    transcriber = StreamingTranscriber(busy, rate, EnergyVAD(rate), hangover_ms=300, partial_interval_ms=100)
+
+    async def saturated():
+        busy._slots.acquire()
+        asyncio.get_running_loop().call_later(0.1, busy._slots.release)
+        events = await transcriber.feed(tone[:8000] + silence[:8000])
+        return events + await transcriber.finish()
+
+    assert asyncio.run(saturated()) == [{"type": "final", "text": "[0.3s of audio]"}]
+    busy.shutdown()
+
+def test_disk_lru_cache_and_tts_synthesis(tmp_path):
+    import asyncio
+    from app.core.cache import DiskLRUCache
+    from app.services.voice_service import StubTTSEngine, VoiceService
+
+    cache = DiskLRUCache(str(tmp_path / "c"), max_bytes=25, suffix=".bin")
+    for key in ("a", "b"):
+        cache.put(key, lambda path: open(path, "wb").write(b"x" * 10))
+    assert cache.get("a")  # "b" is now least recently used
+    cache.put("c", lambda path: open(path, "wb").write(b"x" * 10))
+    assert cache.get("b") is None and cache.get("a") and cache.get("c")
+    assert sorted(os.listdir(tmp_path / "c")) == ["a.bin", "c.bin"]
+    # The index is rebuilt from disk
+    assert len(DiskLRUCache(str(tmp_path / "c"), max_bytes=25, suffix=".bin")) == 2
+    # A file removed behind the cache's back is a miss, not a dangling path
+    os.remove(cache.path("a"))
+    assert cache.get("a") is None and len(cache) == 1 and cache.total_bytes == 10
+
+    class CountingTTS(StubTTSEngine):
+        calls = 0
+
+        def synthesize(self, text, voice, rate, path):
+            CountingTTS.calls += 1
+            super().synthesize(text, voice, rate, path)
+
+    service = VoiceService(tts_engine=CountingTTS(), tts_cache=DiskLRUCache(str(tmp_path / "tts"), suffix=".wav"))
+
+    async def scenario():
+        paths = await asyncio.gather(*(service.synthesize("How can I help you today?") for _ in range(5)))
+        slower = await service.synthesize("How can I help you today?", rate=75)
+        return paths, slower
+
+    paths, slower = asyncio.run(scenario())
+    service.shutdown()
+    assert len(set(paths)) == 1 and CountingTTS.calls == 2
+    assert os.path.getsize(slower) > os.path.getsize(paths[0])
+    assert service.tts_cache.hits + service.tts_cache.misses == 6  # one lookup per request
+
+    # No configured cache: a private temp directory, removed on shutdown
+    uncached = VoiceService()
+    path = uncached.text_to_speech("hi")
+    assert uncached.text_to_speech("hi") == path and os.path.exists(path)
+    uncached.shutdown()
+    assert not os.path.exists(path)
+
+def test_keyword_spotter_only_checks_short_bursts():
+    import numpy as np
+    from app.services.voice_service import AudioRingBuffer, KeywordSpotter
+
+    ring = AudioRingBuffer(8)
+    ring.write(b"abcdef")
+    ring.write(b"ghij")
+    assert ring.last(8) == b"cdefghij" and ring.last(3) == b"hij" and ring.last(20) == b"cdefghij"
+
+    rate = 16000
+    def tone(seconds):
+        return (np.sin(np.arange(int(rate * seconds)) / 5) * 3000).astype("<i2").tobytes()
+    def silence(seconds):
+        return b"\x00\x00" * int(rate * seconds)
+
+    bursts = []
+    spotter = KeywordSpotter(lambda pcm, sr: bursts.append(len(pcm)) or True, rate)
+    def feed(audio):
+        return [spotter.feed(audio[i:i + 2048]) for i in range(0, len(audio), 2048)]
+
+    assert not any(feed(silence(5)))  # quiet room: the matcher never runs
+    assert not any(feed(tone(4) + silence(1)))  # long speech is not a wake word
+    assert spotter.matcher_calls == 0
+    assert any(feed(tone(0.6) + silence(0.5)))
+    assert spotter.matcher_calls == 1
+    # The burst is handed over with its pre-roll and trailing pause
+    assert 2 * rate * (0.6 + 0.2) <= bursts[0] <= 2 * rate * (0.6 + 0.2 + 0.4)
+
+def test_nlp_processor_scans_each_message_once():
+    from app.services.nlp_processor import MedicalNLPProcessor
+
+    nlp = MedicalNLPProcessor()
+    scans = []
+    original = nlp.matcher.hits_by_table
+    nlp.matcher.hits_by_table = lambda text: scans.append(text) or original(text)
+
+    text = "Severe headache and fever since Monday, can I book an appointment?"
+    result = nlp.analyze(text)
+    assert result["intent"] == "book_appointment"
+    assert result["urgency"]["flags"] == ["severe"]
+    assert result["symptoms"] == ["headache", "fever"]
+    result["symptoms"].append("mutated")  # callers get their own copies
+    assert nlp.extract_known_symptoms(text) == ["headache", "fever"]
+    assert len(scans) == 1
+
+def test_symptom_index_top_k_and_batches(tmp_path):
+    from app.services.symptom_index import SymptomIndex
+
+    phrases = ["headache", "migraine headache", "stomach ache", "chest pain", "back pain", "fever", "Fever"]
+    index = SymptomIndex(phrases, batch_size=2)
+    assert len(index) == 6  # duplicates collapse
+    assert index.query("haedache", k=1)[0].phrase == "headache"  # char n-grams absorb the typo
+    top = index.query("chest pains", k=3)
+    assert top[0].phrase == "chest pain" and [m.score for m in top] == sorted((m.score for m in top), reverse=True)
+    assert index.query("xyz") == []
+    assert all(m.score >= 0.3 for m in index.query("pain", k=10, min_score=0.3))
+
+    queries = ["tummy ache", "feverish", "back pain", "qqq", "migraine"]
+    batch = index.query_batch(queries, k=2)
+    assert batch == [index.query(q, k=2) for q in queries]
+    assert [b[0].phrase if b else None for b in batch] == ["stomach ache", "fever", "back pain", None, "migraine headache"]
+
+    path = tmp_path / "ontology.txt"
+    path.write_text("# symptoms\nnausea\n\nvomiting\n")
+    assert SymptomIndex.from_file(str(path)).phrases == ["nausea", "vomiting"]